@@ -0,0 +1,342 @@
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+import metrics
+import response_cache
+from journal_store import DEFAULT_USER, user_path
+from llm import MODEL_NAME, BackendError, contents_text, generation_config, get_backend
+from scheduler import DEFAULT_TIMEOUT, get_scheduler
+
+# Each agent passes its instructions as the model's system instruction, so an
+# agent operation is exactly one model call instead of a system-prompt message
+# followed by the real request. Calls go through the shared scheduler, which
+# rate limits, retries and coalesces identical requests in flight.
+# Every call is timed (agent.generate: the whole call, model.request: each
+# attempt) and its prompt and response tokens are counted in metrics: the usage
+# the model reports (source=model), or an estimate when the backend reports
+# none, as the stub does (source=estimate).
+
+# Model calls made by each agent since the process started
+call_counts = Counter()
+_counts_lock = threading.Lock()
+
+
+def count_call(agent_name):
+    with _counts_lock:
+        call_counts[agent_name] += 1
+
+
+def _call_counts():
+    with _counts_lock:
+        return [("agent_calls_total", {"agent": name}, count) for name, count in call_counts.items()]
+
+
+metrics.register_collector(_call_counts)
+
+
+# Context manager yielding a Counter of the model calls made inside the block.
+# It diffs the process-wide counts, so calls from other threads are included.
+@contextmanager
+def count_calls():
+    with _counts_lock:
+        before = Counter(call_counts)
+    calls = Counter()
+    try:
+        yield calls
+    finally:
+        with _counts_lock:
+            calls.update(call_counts - before)
+
+
+# A model with fixed instructions, used for one-shot requests or chats.
+# With cache_ttl set, one-shot responses are cached on disk for that many seconds
+# in the cache of the user they were made for;
+# bump version when a prompt template changes in a way the input does not show.
+class Agent:
+    def __init__(self, name, system_instruction=None, version=1, cache_ttl=None):
+        self.name = name
+        self.system_instruction = system_instruction.strip() if system_instruction else None
+        self.version = version
+        self.cache_ttl = cache_ttl
+
+    def cache_key(self, prompt):
+        model_config = {"backend": get_backend().name, "model": MODEL_NAME, **generation_config}
+        return response_cache.make_key(self.name, self.version, model_config,
+                                       self.system_instruction, prompt)
+
+    # Send a single request; with on_text the reply is streamed.
+    # Raises llm.BackendError if it fails or does not finish within timeout seconds.
+    def generate(self, prompt, on_text=None, timeout=DEFAULT_TIMEOUT, user_id=DEFAULT_USER):
+        with metrics.timed("agent.generate", agent=self.name):
+            return self._generate(prompt, on_text, timeout, user_id)
+
+    def _generate(self, prompt, on_text, timeout, user_id):
+        key = self.cache_key(prompt)
+        cache_dir = user_path(user_id, response_cache.CACHE_DIR)
+        if self.cache_ttl:
+            text = response_cache.get(key, self.cache_ttl, cache_dir)
+            metrics.increment("response_cache_total", agent=self.name, result="miss" if text is None else "hit")
+            if text is not None:
+                if on_text:
+                    on_text(text)
+                return text
+
+        backend = get_backend()
+
+        def request(remaining):
+            count_call(self.name)
+            usage = {}
+            with metrics.timed("model.request", agent=self.name, backend=backend.name):
+                if not on_text:
+                    text = backend.generate(prompt, system_instruction=self.system_instruction,
+                                            timeout=remaining, usage=usage)
+                else:
+                    start = time.perf_counter()
+                    text = ""
+                    for chunk in backend.stream(prompt, system_instruction=self.system_instruction,
+                                                timeout=remaining, usage=usage):
+                        if not text:
+                            metrics.observe("model.first_token", time.perf_counter() - start, agent=self.name)
+                        text += chunk
+                        on_text(text)
+            self._count_tokens(prompt, text, usage)
+            return text
+
+        text = get_scheduler().call(key, request, timeout=timeout, on_result=on_text)
+
+        if self.cache_ttl:
+            response_cache.put(key, self.name, text, cache_dir)
+        return text
+
+    # Count the tokens of a reply in metrics, estimating them if the backend reported no usage
+    def _count_tokens(self, prompt, text, usage):
+        source = "model" if usage else "estimate"
+        if not usage:
+            usage = {"prompt_tokens": estimate_tokens(contents_text(prompt, self.system_instruction)),
+                     "response_tokens": estimate_tokens(text)}
+        metrics.increment("prompt_tokens_total", usage["prompt_tokens"], agent=self.name, source=source)
+        metrics.increment("response_tokens_total", usage["response_tokens"], agent=self.name, source=source)
+
+    def start_chat(self, max_prompt_tokens=None, keep_turns=None):
+        return AgentChat(self, max_prompt_tokens or CHAT_MAX_PROMPT_TOKENS, keep_turns or CHAT_KEEP_TURNS)
+
+
+# Chat context limits: exchanges kept verbatim and the prompt token budget
+CHAT_KEEP_TURNS = 6
+CHAT_MAX_PROMPT_TOKENS = 4000
+# Marks the end of a text shortened to fit the prompt budget
+CLIPPED = " [...]"
+
+
+# Function to estimate the token count of a text (about 4 characters per token)
+def estimate_tokens(text):
+    return len(text) // 4 + 1
+
+
+# A chat with an agent whose context is bounded: the system instruction, a
+# running summary of older exchanges and the last keep_turns exchanges verbatim.
+# Every send is one model call; folding old exchanges into the summary is one
+# more call, made once the chat holds twice keep_turns exchanges or goes over
+# the token budget. The budget is a hard limit on the (estimated) prompt: when
+# what is kept still does not fit, it is shortened before sending (see fit);
+# only a system instruction longer than the budget can go over it.
+class AgentChat:
+    def __init__(self, agent, max_prompt_tokens=CHAT_MAX_PROMPT_TOKENS, keep_turns=CHAT_KEEP_TURNS):
+        self.agent = agent
+        self.max_prompt_tokens = max_prompt_tokens
+        self.keep_turns = keep_turns
+        self.turns = []
+        self.summary = None
+        # Estimated prompt tokens of each turn sent
+        self.prompt_tokens = []
+
+    def contents(self, message=None):
+        contents = []
+        if self.summary:
+            contents.append({"role": "user", "parts": [f"Summary of our conversation so far:\n{self.summary}"]})
+            contents.append({"role": "model", "parts": ["Thank you, I remember."]})
+        for user_text, model_text in self.turns:
+            contents.append({"role": "user", "parts": [user_text]})
+            contents.append({"role": "model", "parts": [model_text]})
+        if message is not None:
+            contents.append({"role": "user", "parts": [message]})
+        return contents
+
+    def count_tokens(self, contents):
+        text = (self.agent.system_instruction or "") + "".join(
+            part for content in contents for part in content["parts"]
+        )
+        return estimate_tokens(text)
+
+    # Function to cut contents ending with a new message down to max_prompt_tokens:
+    # the kept exchanges are shortened first (oldest first), then the summary,
+    # then the new message itself
+    def fit(self, contents):
+        if self.count_tokens(contents) <= self.max_prompt_tokens:
+            return contents
+        contents = [dict(content, parts=list(content["parts"])) for content in contents]
+        first = 2 if self.summary else 0
+        order = list(range(first, len(contents) - 1)) + ([0] if self.summary else []) + [len(contents) - 1]
+        for i in order:
+            excess = self.count_tokens(contents) - self.max_prompt_tokens
+            if excess <= 0:
+                break
+            text = contents[i]["parts"][0]
+            # About 4 characters per token, plus room for the marker and rounding
+            keep = max(len(text) - 4 * (excess + 1) - len(CLIPPED), 0)
+            contents[i]["parts"] = [text[:keep] + CLIPPED]
+        return contents
+
+    def send(self, message, on_text=None):
+        with metrics.timed("chat.turn", agent=self.agent.name):
+            contents = self.fit(self.contents(message))
+            self.prompt_tokens.append(self.count_tokens(contents))
+            text = self.agent.generate(contents, on_text=on_text)
+            self.turns.append((message, text))
+            self.compress()
+            return text
+
+    # Fold the oldest exchanges into the running summary. If the summary call
+    # fails, every exchange is kept and folding is tried again after the next turn.
+    def compress(self):
+        over_budget = self.count_tokens(self.contents()) > self.max_prompt_tokens
+        if len(self.turns) < 2 * self.keep_turns and not over_budget:
+            return
+
+        keep = self.keep_turns
+        if over_budget:
+            # Keep as many recent exchanges as fit in half the budget (at least one)
+            keep = 1
+            while keep < min(self.keep_turns, len(self.turns)):
+                recent = self.turns[-(keep + 1):]
+                size = estimate_tokens("".join(u + m for u, m in recent))
+                if size > self.max_prompt_tokens // 2:
+                    break
+                keep += 1
+        old, recent = self.turns[:-keep], self.turns[-keep:]
+        if not old:
+            return
+
+        conversation = "\n".join(f"User: {u}\nYou: {m}" for u, m in old)
+        prompt = f"Conversation:\n{conversation}"
+        if self.summary:
+            prompt = f"Summary so far:\n{self.summary}\n\n{prompt}"
+        try:
+            summary = CHAT_SUMMARY_AGENT.generate(prompt).strip()
+        except BackendError:
+            return
+        self.summary, self.turns = summary, recent
+
+
+SUMMARY_AGENT = Agent("summary", """
+You are a journaling assistant. Summarize the user's full journaling session.
+
+Include:
+- Important events and dates
+- The emotional tone and how it changed
+- Observations about the user's personality and emotional state
+
+Keep it short (4-6 lines). Write in a friendly, human tone.
+
+Output only the summary text. Do NOT include any JSON formatting or labels.
+""")
+
+# Responses over the same summaries are reused for a week
+CACHE_TTL = 7 * 24 * 3600
+
+INSIGHTS_AGENT = Agent("insights", cache_ttl=CACHE_TTL, system_instruction="""
+Based on these journal summaries, identify 3-5 key insights about:
+1. Recurring themes or patterns
+2. Emotional trends
+3. Potential areas for personal growth
+4. Strengths demonstrated
+
+If current insights are given, keep what still holds, revise what the new
+summaries change, and add what they reveal; return the full updated list.
+
+Format each insight as a concise bullet point without numbering or prefixes.
+Be specific, thoughtful, and empathetic.
+""")
+
+MENTOR_AGENT = Agent("mentor", """
+You are a concise, emotionally intelligent journaling mentor.
+
+Your goal is to:
+- Respond briefly and warmly (1-2 sentences max).
+- Acknowledge the user's feelings with empathy.
+- Gently guide them to reflect deeper or express more.
+- Avoid giving advice or lecturing.
+- Use simple, grounded language.
+
+Always end your response with a gentle question or invitation to reflect more.
+""")
+
+ECHO_AGENT = Agent("echo", """
+You are a warm, emotionally intelligent friend.
+
+Your job is to:
+- Read the journal summary shared by the user.
+- Remember the important incidents and also include them in your response 
+- Understand what they're feeling based on what they've been through.
+- Respond in a brief, kind, and human way — like a close friend would.
+- If they seem sad, be extra gentle and comforting.
+- If they're happy, celebrate with them and feel free to joke or be playful.
+- End your response with a soft question or invitation to share more if necessary.
+
+Make the user feel safe, seen, and emotionally supported.
+Keep things light and friendly — no lecturing, no deep analysis, and definitely no judgment.
+
+Think like a mix of: a close friend, a safe space, and someone who just gets them.
+""")
+
+REFLECTION_AGENT = Agent("reflection", cache_ttl=CACHE_TTL, system_instruction="""
+You are a gentle, emotionally intelligent journaling assistant reviewing someone's past journal entries.
+
+Your role is to:
+
+Reflect thoughtfully on the collection of entries from a first-person point of view, as if you're helping them understand their own patterns and emotions.
+
+Identify the overall emotional tone, recurring themes, habits, or subtle insights.
+
+Provide a warm, concise reflection (4–6 sentences).
+
+Avoid summarizing. Instead, offer thoughtful self-awareness or emotional insight.
+
+Use soft, grounded language. Do not give advice.
+""")
+
+LETTER_AGENT = Agent("letter", cache_ttl=CACHE_TTL, system_instruction="""
+You are a gentle, emotionally intelligent journaling assistant.
+
+Your role is to:
+- Read a collection of past journal entry summaries.
+- Find those that carry a similar emotional mood or tenderness to the most recent one.
+- Write a heartfelt, grounding letter *from the voice of the past self*, speaking gently to the present self.
+- Use a second-person point of view, as if past-you is reminding present-you of something you've already lived through and understood.
+- Occasionally, include a soft memory or moment from one of the past summaries—perhaps a feeling, a phrase, or even a date (only if it flows naturally).
+- Keep the letter short, not more than 10–15 lines. Focus on emotional resonance, not explanation.
+- Use poetic or affectionate language if it feels right—but stay grounded and real.
+
+Do not summarize or reflect. Just write the letter, as if you're gently whispering from the past.
+""")
+
+CONDENSE_AGENT = Agent("condense", """
+You condense journal summaries into a short digest for later reflection.
+
+Keep:
+- Important events and their dates
+- The emotional tone and how it changed
+- Recurring themes
+
+Write 3-5 plain sentences. Output only the digest.
+""")
+
+CHAT_SUMMARY_AGENT = Agent("chat_summary", """
+You keep a running summary of a supportive conversation between a user and their
+journaling companion ("You").
+
+Merge the summary so far (if any) with the new conversation. Keep what the user
+shared, how they felt and anything the companion promised or asked. Write at most
+6 short sentences. Output only the summary.
+""")
@@ -0,0 +1,177 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from bench_startup import copy_tree
+
+# End-to-end benchmark of the app flows, fully offline.
+#
+# Every simulated user runs in its own process and data directory with
+# LLM_BACKEND=stub, so model latency, token rate and failures are controlled
+# by the LLM_STUB_* settings instead of the network. One flow is:
+#   mentor turns -> end session -> summary ready -> echo chat turns
+#   -> self-reflection -> letter from past
+#
+# Usage:
+#   python bench_flows.py
+#   python bench_flows.py --users 4 --turns 5 --latency 0.2 --tokens-per-second 50
+#   python bench_flows.py --failure-rate 0.1
+
+
+# Function to click the first button with a label
+def click(at, label):
+    for button in at.button:
+        if button.label == label:
+            button.click().run()
+            return
+    raise LookupError(f"No button labelled {label!r}")
+
+
+# Function to time a step of the flow, collecting the exceptions it shows
+def timed(steps, errors, at, name, action):
+    start = time.perf_counter()
+    action()
+    steps.setdefault(name, []).append(time.perf_counter() - start)
+    errors.extend(f"{name}: {e.value}" for e in at.exception)
+
+
+# Worker: runs one user's flow inside a fresh process
+def run_worker(app_dir, app, turns, summary_timeout):
+    from streamlit.testing.v1 import AppTest
+
+    os.chdir(app_dir)
+    sys.path.insert(0, app_dir)
+    import agents
+    import summary_jobs
+
+    steps = {}
+    errors = []
+    at = AppTest.from_file(os.path.join(app_dir, app), default_timeout=120)
+    timed(steps, errors, at, "cold_start", at.run)
+    at.radio[0].set_value("Use Journaling Mentor").run()
+
+    for turn in range(turns):
+        at.text_area(key="mentor_input").input(f"Turn {turn}: today felt long but I got through it").run()
+        timed(steps, errors, at, "mentor_turn", lambda: click(at, "Send"))
+    timed(steps, errors, at, "end_session", lambda: click(at, "End Chat Session"))
+
+    # The summary is written in the background; time until the app shows it
+    def wait_for_summary():
+        deadline = time.perf_counter() + summary_timeout
+        while at.session_state.summary_job and time.perf_counter() < deadline:
+            job = summary_jobs.get_job(at.session_state.summary_job)
+            if job and job["status"] != summary_jobs.PENDING:
+                break
+            time.sleep(0.01)
+        at.run()
+    timed(steps, errors, at, "summary_ready", wait_for_summary)
+
+    if any(b.label == "Retry Summary" for b in at.button):
+        errors.append("summary failed")
+
+    if any(b.label == "Start Echo Chat" for b in at.button):
+        timed(steps, errors, at, "echo_welcome", lambda: click(at, "Start Echo Chat"))
+        # journalling.py shows the echo chat in the journal view but has no button back to it
+        if at.session_state.app_view != "journal":
+            at.session_state["app_view"] = "journal"
+            at.run()
+        for turn in range(turns):
+            at.text_area(key="echo_input").input(f"Thanks, turn {turn}").run()
+            timed(steps, errors, at, "echo_turn", lambda: click(at, "Send"))
+        if app == "journalling2.py":
+            timed(steps, errors, at, "self_reflection", lambda: click(at, "📝 Self-Reflection"))
+            timed(steps, errors, at, "letter_from_past", lambda: click(at, "💌 Letter from Past"))
+
+    print(json.dumps({
+        "steps": steps,
+        "model_calls": dict(agents.call_counts),
+        "errors": errors,
+    }))
+
+
+# Function to start one user's flow in a fresh process
+def start_user(app_dir, args, env):
+    cmd = [sys.executable, os.path.abspath(__file__), "--worker", app_dir, "--app", args.app,
+           "--turns", str(args.turns), "--summary-timeout", str(args.summary_timeout)]
+    return subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, env=env)
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark full app flows against the stub LLM backend.")
+    parser.add_argument("--app", default="journalling2.py")
+    parser.add_argument("--users", type=int, default=1, help="concurrent simulated users")
+    parser.add_argument("--turns", type=int, default=3, help="mentor and echo turns per flow")
+    parser.add_argument("--latency", type=float, default=0.05, help="stub latency per call (s)")
+    parser.add_argument("--tokens-per-second", type=float, default=200)
+    parser.add_argument("--reply-tokens", type=int, default=40)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--summary-timeout", type=float, default=60)
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args.worker, args.app, args.turns, args.summary_timeout)
+        return
+
+    source_dir = os.path.dirname(os.path.abspath(__file__))
+    with tempfile.TemporaryDirectory() as root:
+        processes = []
+        for user in range(args.users):
+            app_dir = os.path.join(root, f"user{user}")
+            os.mkdir(app_dir)
+            copy_tree(source_dir, app_dir)
+            env = dict(os.environ, LLM_BACKEND="stub",
+                       LLM_STUB_LATENCY=str(args.latency),
+                       LLM_STUB_TOKENS_PER_SECOND=str(args.tokens_per_second),
+                       LLM_STUB_REPLY_TOKENS=str(args.reply_tokens),
+                       LLM_STUB_FAILURE_RATE=str(args.failure_rate),
+                       LLM_STUB_SEED=str(args.seed + user))
+            processes.append(start_user(app_dir, args, env))
+
+        start = time.perf_counter()
+        results = []
+        for process in processes:
+            stdout, stderr = process.communicate()
+            if process.returncode != 0:
+                results.append({"steps": {}, "model_calls": {},
+                                "errors": [stderr.strip().splitlines()[-1] if stderr else "failed"]})
+            else:
+                results.append(json.loads(stdout.strip().splitlines()[-1]))
+        wall = time.perf_counter() - start
+
+    steps = {}
+    calls = {}
+    errors = []
+    for result in results:
+        for name, times in result["steps"].items():
+            steps.setdefault(name, []).extend(times)
+        for name, count in result["model_calls"].items():
+            calls[name] = calls.get(name, 0) + count
+        errors.extend(result["errors"])
+
+    print(f"{args.app}: {args.users} user(s) x {args.turns} turn(s), stub latency {args.latency}s, "
+          f"{args.tokens_per_second:g} tok/s, failure rate {args.failure_rate:g}")
+    print(f"\n{'step':<18}{'n':>5}{'p50 ms':>10}{'p95 ms':>10}{'max ms':>10}")
+    for name, times in steps.items():
+        print(f"{name:<18}{len(times):>5}{percentile(times, 0.5) * 1000:>10.1f}"
+              f"{percentile(times, 0.95) * 1000:>10.1f}{max(times) * 1000:>10.1f}")
+
+    interactions = sum(len(times) for name, times in steps.items() if name != "cold_start")
+    print(f"\nwall time: {wall:.2f}s, throughput: {interactions / wall:.2f} interactions/s")
+    print(f"model calls: {calls}")
+    print(f"errors: {len(errors)}")
+    for error in errors[:10]:
+        print(f"  {error}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+import argparse
+import os
+import random
+import tempfile
+import time
+from search_index import SearchIndex
+
+# Benchmark of the full-text search index on a synthetic journal.
+#
+# Builds an index of --sessions sessions (one document per entry, with its
+# mentor reply, and one per summary), then times:
+#   build        - indexing the whole journal at once (a first search)
+#   incremental  - indexing one more session, as after ending a session
+#   query        - ranked searches for one, two and prefix terms
+#
+# Usage:
+#   python bench_search.py
+#   python bench_search.py --sessions 50000 --entries 5 --queries 500
+
+TOPICS = ["work", "deadline", "family", "coffee", "walk", "park", "sleep", "friends", "stress", "gym",
+          "happy", "tired", "anxious", "calm", "grateful", "meeting", "project", "dinner", "rain", "music"]
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+# Function to make one synthetic session with a summary
+def make_session(rng, vocabulary, number, entries):
+    timestamp = f"2024-01-01T00:00:00.{number:06d}"
+
+    def text(words):
+        return " ".join(rng.choice(vocabulary) for _ in range(words))
+    session = {
+        "session_timestamp": timestamp,
+        "entries": [{"timestamp": timestamp, "user_input": text(30), "mentor_response": text(20)}
+                    for _ in range(entries)],
+    }
+    return session, {"timestamp": timestamp, "session_timestamp": timestamp, "summary": text(60)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark full-text search over a synthetic journal.")
+    parser.add_argument("--sessions", type=int, default=20000)
+    parser.add_argument("--entries", type=int, default=5, help="entries per session")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    vocabulary = [f"x{i}" for i in range(20000)] + TOPICS * 50
+    pairs = [make_session(rng, vocabulary, i, args.entries) for i in range(args.sessions)]
+    sessions = [session for session, _ in pairs]
+    summaries = [summary_entry for _, summary_entry in pairs]
+
+    with tempfile.TemporaryDirectory() as root:
+        index = SearchIndex(os.path.join(root, "search.db"))
+        start = time.perf_counter()
+        documents = index.sync(sessions, summaries)
+        build = time.perf_counter() - start
+
+        session, summary_entry = make_session(rng, vocabulary, args.sessions, args.entries)
+        start = time.perf_counter()
+        index.sync(sessions + [session], summaries + [summary_entry])
+        incremental = time.perf_counter() - start
+
+        queries = {
+            "one term": lambda: rng.choice(TOPICS),
+            "two terms": lambda: f"{rng.choice(TOPICS)} {rng.choice(TOPICS)}",
+            "prefix": lambda: rng.choice(TOPICS)[:3],
+        }
+        timings = {}
+        for name, make_query in queries.items():
+            for _ in range(args.queries):
+                query = make_query()
+                start = time.perf_counter()
+                index.search(query)
+                timings.setdefault(name, []).append(time.perf_counter() - start)
+        index.close()
+
+    print(f"{args.sessions} sessions, {documents} documents")
+    print(f"build: {build:.2f}s, incremental (one session): {incremental * 1000:.1f}ms")
+    print(f"\n{'query':<12}{'p50 ms':>10}{'p95 ms':>10}{'max ms':>10}")
+    for name, times in timings.items():
+        print(f"{name:<12}{percentile(times, 0.5) * 1000:>10.2f}{percentile(times, 0.95) * 1000:>10.2f}"
+              f"{max(times) * 1000:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
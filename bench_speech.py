@@ -0,0 +1,148 @@
+import argparse
+import glob
+import os
+import re
+import threading
+import time
+import transcription
+from speech_worker import FileSource
+
+# Benchmark of the speech-to-text backends on recorded WAV fixtures.
+#
+# Every file is cut into chunks like a recording would be and fed to a stream
+# of each backend, timing:
+#   - load: loading the backend's model (once per process, not per file)
+#   - RTF: processing time / audio duration (below 1 keeps up with speech)
+#   - chunk latency: time from a chunk being captured to its text coming back
+#   - final latency: time from the end of the audio to the full transcript
+# If <name>.txt sits next to <name>.wav, the word error rate is reported too.
+# Without paths, the clips in FIXTURES_DIR are used (see its README.md).
+#
+# Usage:
+#   python bench_speech.py                                # every backend, bundled clips
+#   python bench_speech.py a.wav b.wav --backend vosk --backend google
+#   python bench_speech.py my_recordings/ --chunk-seconds 2
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "speech")
+
+
+# Function to list the WAV files named on the command line (directories are searched)
+def wav_files(paths):
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(sorted(glob.glob(os.path.join(path, "*.wav"))))
+        else:
+            files.append(path)
+    return files
+
+
+# Function to count word edits between a transcript and its reference, over the reference length
+def word_error_rate(reference, hypothesis):
+    ref = re.findall(r"[a-z0-9']+", reference.lower())
+    hyp = re.findall(r"[a-z0-9']+", hypothesis.lower())
+    distances = list(range(len(hyp) + 1))
+    for i, ref_word in enumerate(ref, 1):
+        previous, distances[0] = distances[0], i
+        for j, hyp_word in enumerate(hyp, 1):
+            previous, distances[j] = distances[j], min(
+                distances[j] + 1, distances[j - 1] + 1, previous + (ref_word != hyp_word))
+    return distances[-1] / max(len(ref), 1)
+
+
+# Function to transcribe one file through a backend stream, timing every chunk
+def run_file(backend, path, chunk_seconds):
+    parts = []
+    chunk_times = []
+    audio_seconds = 0.0
+    stream = backend.stream()
+    for chunk in FileSource(path, chunk_seconds=chunk_seconds).chunks(threading.Event()):
+        audio_seconds += len(chunk.frame_data) / (chunk.sample_rate * chunk.sample_width)
+        start = time.perf_counter()
+        final, _ = stream.accept(chunk)
+        chunk_times.append(time.perf_counter() - start)
+        if final:
+            parts.append(final)
+    start = time.perf_counter()
+    final = stream.finish()
+    finish_time = time.perf_counter() - start
+    if final:
+        parts.append(final)
+    return {
+        "audio": audio_seconds,
+        "processing": sum(chunk_times) + finish_time,
+        "chunks": chunk_times,
+        "final": (chunk_times[-1] if chunk_times else 0.0) + finish_time,
+        "text": " ".join(parts),
+    }
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+# Function to benchmark one backend on every file, or return why it can't run
+def bench_backend(name, files, chunk_seconds):
+    backend = transcription.BACKENDS[name]()
+    start = time.perf_counter()
+    try:
+        if hasattr(backend, "model"):
+            backend.model()
+    except Exception as e:
+        return {"skipped": f"{type(e).__name__}: {e}"}
+    load = time.perf_counter() - start
+
+    results = []
+    for path in files:
+        try:
+            result = run_file(backend, path, chunk_seconds)
+        except Exception as e:
+            return {"skipped": f"{os.path.basename(path)}: {type(e).__name__}: {e}"}
+        reference = os.path.splitext(path)[0] + ".txt"
+        if os.path.exists(reference):
+            with open(reference, encoding="utf-8") as f:
+                result["wer"] = word_error_rate(f.read(), result["text"])
+        result["file"] = os.path.basename(path)
+        results.append(result)
+    return {"load": load, "files": results}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare speech-to-text backends on WAV fixtures.")
+    parser.add_argument("paths", nargs="*", default=[FIXTURES_DIR],
+                        help="WAV files or directories of them (default: the bundled clips)")
+    parser.add_argument("--backend", choices=list(transcription.BACKENDS), action="append")
+    parser.add_argument("--chunk-seconds", type=float, default=5, help="audio per chunk, like one phrase")
+    parser.add_argument("--show-text", action="store_true", help="print every transcript")
+    args = parser.parse_args()
+
+    files = wav_files(args.paths)
+    if not files:
+        parser.error("no WAV files found")
+
+    print(f"{len(files)} file(s), {args.chunk_seconds:g}s chunks")
+    print(f"\n{'backend':<10}{'load s':>8}{'audio s':>9}{'RTF':>7}{'chunk p50':>11}{'chunk p95':>11}"
+          f"{'final p50':>11}{'WER':>7}")
+    for name in args.backend or list(transcription.BACKENDS):
+        result = bench_backend(name, files, args.chunk_seconds)
+        if "skipped" in result:
+            print(f"{name:<10}skipped ({result['skipped']})")
+            continue
+        files_done = result["files"]
+        audio = sum(r["audio"] for r in files_done)
+        processing = sum(r["processing"] for r in files_done)
+        chunks = [t for r in files_done for t in r["chunks"]] or [0.0]
+        finals = [r["final"] for r in files_done]
+        wers = [r["wer"] for r in files_done if "wer" in r]
+        wer = f"{sum(wers) / len(wers):.1%}" if wers else "-"
+        print(f"{name:<10}{result['load']:>8.2f}{audio:>9.1f}{processing / max(audio, 1e-9):>7.2f}"
+              f"{percentile(chunks, 0.5) * 1000:>9.0f}ms{percentile(chunks, 0.95) * 1000:>9.0f}ms"
+              f"{percentile(finals, 0.5) * 1000:>9.0f}ms{wer:>7}")
+        if args.show_text:
+            for r in files_done:
+                print(f"  {r['file']}: {r['text']}")
+
+
+if __name__ == "__main__":
+    main()
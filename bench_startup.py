@@ -0,0 +1,123 @@
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+# Startup benchmark for the Streamlit apps.
+#
+# Each measurement runs in a fresh Python process against a copy of the app
+# and its data, using Streamlit's AppTest harness:
+#   cold start  - first run of the script (imports, config, data load)
+#   rerun       - every following run, i.e. the cost of one widget interaction
+#
+# Usage:
+#   python bench_startup.py                      # current working tree
+#   python bench_startup.py --rev HEAD~1         # also benchmark an older commit
+#   python bench_startup.py --app journalling.py --reruns 50
+
+HEAVY_MODULES = ["google.generativeai", "speech_recognition"]
+
+
+# Function to copy the scripts and journal data of a tree into a temp dir
+def copy_tree(source_dir, target_dir):
+    for name in os.listdir(source_dir):
+        path = os.path.join(source_dir, name)
+        if os.path.isfile(path) and name.endswith((".py", ".json", ".jsonl", ".txt")):
+            shutil.copy(path, target_dir)
+
+
+# Function to export a git revision into a temp dir
+def export_revision(rev, target_dir):
+    archive = subprocess.run(["git", "archive", rev], check=True, capture_output=True).stdout
+    subprocess.run(["tar", "-x", "-C", target_dir], input=archive, check=True)
+
+
+# Function to run one app in a fresh process and collect its timings
+def measure(app_dir, app, reruns, timeout):
+    cmd = [sys.executable, os.path.abspath(__file__), "--worker", app_dir, "--app", app,
+           "--reruns", str(reruns)]
+    try:
+        result = subprocess.run(cmd, capture_output=True, text=True, timeout=timeout)
+    except subprocess.TimeoutExpired:
+        return {"error": f"timed out after {timeout}s"}
+    if result.returncode != 0:
+        return {"error": result.stderr.strip().splitlines()[-1] if result.stderr else "failed"}
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+# Function to time the import of a module in a fresh process
+def measure_import(module):
+    code = f"import time; t = time.perf_counter(); import {module}; print(time.perf_counter() - t)"
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True)
+    if result.returncode != 0:
+        return None
+    return float(result.stdout.strip().splitlines()[-1])
+
+
+# Worker: runs inside the fresh process
+def run_worker(app_dir, app, reruns):
+    from streamlit.testing.v1 import AppTest
+
+    os.chdir(app_dir)
+    sys.path.insert(0, app_dir)
+
+    start = time.perf_counter()
+    at = AppTest.from_file(os.path.join(app_dir, app), default_timeout=60)
+    at.run()
+    cold = time.perf_counter() - start
+
+    rerun_times = []
+    for _ in range(reruns):
+        start = time.perf_counter()
+        at.run()
+        rerun_times.append(time.perf_counter() - start)
+
+    rerun_times.sort()
+    print(json.dumps({
+        "cold_start_ms": round(cold * 1000, 1),
+        "rerun_mean_ms": round(sum(rerun_times) / len(rerun_times) * 1000, 1),
+        "rerun_p50_ms": round(rerun_times[len(rerun_times) // 2] * 1000, 1),
+        "rerun_max_ms": round(rerun_times[-1] * 1000, 1),
+        "exceptions": [str(e.value) for e in at.exception],
+        "heavy_modules_loaded": [m for m in HEAVY_MODULES if m in sys.modules],
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark Streamlit app cold start and rerun cost.")
+    parser.add_argument("--app", default="journalling2.py")
+    parser.add_argument("--reruns", type=int, default=20)
+    parser.add_argument("--rev", action="append", default=[],
+                        help="git revision to benchmark as well (repeatable)")
+    parser.add_argument("--timeout", type=float, default=120)
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args.worker, args.app, args.reruns)
+        return
+
+    print("Import cost of heavy dependencies:")
+    for module in HEAVY_MODULES:
+        seconds = measure_import(module)
+        print(f"  {module}: " + (f"{seconds * 1000:.0f} ms" if seconds is not None else "not installed"))
+
+    targets = [("working tree", None)] + [(rev, rev) for rev in args.rev]
+    for label, rev in targets:
+        with tempfile.TemporaryDirectory() as app_dir:
+            if rev:
+                export_revision(rev, app_dir)
+            else:
+                copy_tree(os.path.dirname(os.path.abspath(__file__)), app_dir)
+            result = measure(app_dir, args.app, args.reruns, args.timeout)
+        print(f"\n{args.app} @ {label}:")
+        for key, value in result.items():
+            print(f"  {key}: {value}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,309 @@
+import os
+import threading
+from collections import OrderedDict
+import metrics
+from journal_store import DEFAULT_USER, open_store, user_path, user_slug
+from metadata_index import METADATA_PATH, MetadataIndex
+from search_index import MAX_RESULTS, SEARCH_DB, SearchIndex
+
+# Streamlit re-runs the app script on every interaction, but imported modules
+# stay loaded, so this cache is shared by every rerun and browser session.
+# Every user has their own store, cache entries and write lock, so users never
+# wait on or read each other's journals. Opening a store (with any import of
+# legacy files), loads (cache misses), saves, the metadata index's reads and
+# writes and searches are timed in metrics as journal.open, journal.load,
+# journal.append, metadata.* and search.*.
+
+# Upper bounds for the cache (bytes are measured on the backing files)
+CACHE_MAX_ITEMS = 48
+CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+# Records a search index may be behind and still be synced on the request path;
+# further behind (e.g. never built), a background thread builds it in batches
+# of SEARCH_BUILD_BATCH records while searches report that it is indexing
+SEARCH_SYNC_INLINE = 200
+SEARCH_BUILD_BATCH = 1000
+
+_stores = {}
+_write_locks = {}
+_search_indexes = {}
+_search_builds = set()
+_store_lock = threading.Lock()
+
+
+# Function to get the process-wide journal store of a user
+def get_store(user_id=DEFAULT_USER):
+    user_id = user_slug(user_id)
+    with _store_lock:
+        if user_id not in _stores:
+            with metrics.timed("journal.open"):
+                _stores[user_id] = open_store(user_id=user_id)
+            _write_locks[user_id] = threading.Lock()
+        return _stores[user_id]
+
+
+def _write_lock(user_id):
+    get_store(user_id)
+    with _store_lock:
+        return _write_locks[user_slug(user_id)]
+
+
+# Function to fingerprint the files behind sessions or summaries
+def file_signature(paths):
+    signature = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+            signature.append((path, stat.st_mtime_ns, stat.st_size))
+        except FileNotFoundError:
+            signature.append((path, None, 0))
+    return tuple(signature)
+
+
+# LRU cache of loaded data, invalidated when the backing files change
+class FileBackedCache:
+    def __init__(self, max_items=CACHE_MAX_ITEMS, max_bytes=CACHE_MAX_BYTES):
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, signature, loader):
+        with self._lock:
+            cached = self._items.get(key)
+            if cached and cached[0] == signature:
+                self._items.move_to_end(key)
+                self.hits += 1
+                return cached[1]
+
+        self.misses += 1
+        value = loader()
+        self.put(key, signature, value)
+        return value
+
+    def put(self, key, signature, value):
+        size = sum(part[2] for part in signature)
+        with self._lock:
+            self._items.pop(key, None)
+            if size > self.max_bytes:
+                return
+            self._items[key] = (signature, value, size)
+            while (len(self._items) > self.max_items
+                   or sum(item[2] for item in self._items.values()) > self.max_bytes):
+                self._items.popitem(last=False)
+
+    # Replace a cached value after our own write, if nobody else wrote in between
+    def update(self, key, old_signature, new_signature, update_fn):
+        with self._lock:
+            cached = self._items.get(key)
+        if cached and cached[0] == old_signature:
+            self.put(key, new_signature, update_fn(cached[1]))
+        else:
+            self.invalidate(key)
+
+    def invalidate(self, key=None):
+        with self._lock:
+            if key is None:
+                self._items.clear()
+            else:
+                self._items.pop(key, None)
+
+
+cache = FileBackedCache()
+
+
+def _cache_counts():
+    return [("data_cache_hits_total", {}, cache.hits), ("data_cache_misses_total", {}, cache.misses),
+            ("data_cache_items", {}, len(cache._items))]
+
+
+metrics.register_collector(_cache_counts)
+
+
+# Function to fingerprint the files behind one or more kinds of records of a store
+def _signature(store, kinds):
+    return file_signature([path for kind in kinds for path in store.paths(kind)])
+
+
+def _cached(user_id, name, kinds, loader):
+    store = get_store(user_id)
+
+    def load():
+        with metrics.timed("journal.load", kind=name):
+            return loader(store)
+    return cache.get((user_slug(user_id), name), _signature(store, kinds), load)
+
+
+# Function to load all sessions of a user (the returned list must not be modified)
+def load_sessions(user_id=DEFAULT_USER):
+    return _cached(user_id, "sessions", ("sessions",), lambda store: store.load_sessions())
+
+
+# Function to load all summaries of a user (the returned list must not be modified)
+def load_summaries(user_id=DEFAULT_USER):
+    return _cached(user_id, "summaries", ("summaries",), lambda store: store.load_summaries())
+
+
+# Function to load the saved metadata index, rebuilding it if the journal changed behind its back
+def _load_metadata(user_id, store):
+    path = user_path(user_id, METADATA_PATH)
+    signature = _signature(store, ("sessions", "summaries"))
+    with metrics.timed("metadata.load"):
+        index = MetadataIndex.load(path, signature)
+    if index is None:
+        sessions, summaries = load_sessions(user_id), load_summaries(user_id)
+        with metrics.timed("metadata.build"):
+            index = MetadataIndex.build(sessions, summaries)
+        with metrics.timed("metadata.save"):
+            index.save(path, signature)
+    return index
+
+
+# Function to get the metadata index of a user's sessions and summaries
+def metadata(user_id=DEFAULT_USER):
+    return _cached(user_id, "metadata", ("sessions", "summaries"), lambda store: _load_metadata(user_id, store))
+
+
+# Function to extend the cached metadata index after our own write and save it
+def _update_metadata(user_id, old_signature, new_signature, update_fn):
+    def update(index):
+        update_fn(index)
+        with metrics.timed("metadata.save"):
+            index.save(user_path(user_id, METADATA_PATH), new_signature)
+        return index
+    cache.update((user_slug(user_id), "metadata"), old_signature, new_signature, update)
+
+
+def _open_search_index(user_id):
+    with _store_lock:
+        if user_id not in _search_indexes:
+            os.makedirs(user_path(user_id), exist_ok=True)
+            _search_indexes[user_id] = SearchIndex(user_path(user_id, SEARCH_DB))
+        return _search_indexes[user_id]
+
+
+# Function to get the full-text search index of a user, brought up to date with
+# the journal however long it takes (for tools; the app searches through search())
+def search_index(user_id=DEFAULT_USER):
+    user_id = user_slug(user_id)
+    index = _open_search_index(user_id)
+    sessions, summaries = load_sessions(user_id), load_summaries(user_id)
+    with metrics.timed("search.sync"):
+        index.sync(sessions, summaries)
+    return index
+
+
+# Function to bring a user's search index up to date without blocking on a large
+# backlog: True once it is, False while a background build catches up
+def sync_search_index(user_id=DEFAULT_USER):
+    user_id = user_slug(user_id)
+    index = _open_search_index(user_id)
+    with _store_lock:
+        if user_id in _search_builds:
+            return False
+    sessions, summaries = load_sessions(user_id), load_summaries(user_id)
+    behind = index.behind(len(sessions), len(summaries))
+    if behind > SEARCH_SYNC_INLINE:
+        with _store_lock:
+            if user_id not in _search_builds:
+                _search_builds.add(user_id)
+                threading.Thread(target=_build_search_index, args=(user_id, index),
+                                 name=f"search-build-{user_id}", daemon=True).start()
+        return False
+    if behind:
+        with metrics.timed("search.sync"):
+            index.sync(sessions, summaries)
+    return True
+
+
+# Function to index a user's journal in batches until the index has caught up
+def _build_search_index(user_id, index):
+    try:
+        while True:
+            sessions, summaries = load_sessions(user_id), load_summaries(user_id)
+            if not index.behind(len(sessions), len(summaries)):
+                return
+            with metrics.timed("search.build"):
+                index.sync(sessions, summaries, limit=SEARCH_BUILD_BATCH)
+    finally:
+        with _store_lock:
+            _search_builds.discard(user_id)
+
+
+# Function to search a user's entries, mentor replies and summaries, best match
+# first; None while the search index is being built (see sync_search_index)
+def search(query, user_id=DEFAULT_USER, limit=MAX_RESULTS):
+    if not sync_search_index(user_id):
+        return None
+    index = _open_search_index(user_slug(user_id))
+    with metrics.timed("search.query"):
+        return index.search(query, limit)
+
+
+# Function to count a user's summaries
+def count_summaries(user_id=DEFAULT_USER):
+    store = get_store(user_id)
+    if store.indexed_queries:
+        return store.count_summaries()
+    return len(load_summaries(user_id))
+
+
+# Function to get limit summaries of a user, newest first, skipping the offset newest
+def page_summaries(offset=0, limit=10, user_id=DEFAULT_USER):
+    store = get_store(user_id)
+    if store.indexed_queries:
+        return store.page_summaries(offset, limit)
+    summaries = load_summaries(user_id)
+    end = max(len(summaries) - offset, 0)
+    return summaries[max(end - limit, 0):end][::-1]
+
+
+# Function to get the most recent summary of a user
+def latest_summary(user_id=DEFAULT_USER):
+    store = get_store(user_id)
+    if store.indexed_queries:
+        return store.latest_summary()
+    summaries = load_summaries(user_id)
+    row = metadata(user_id).latest_summary_row()
+    if row is None or row >= len(summaries):
+        return summaries[-1] if summaries else None
+    return summaries[row]
+
+
+# Function to save a session and update the caches without re-reading the file
+def append_session(session, user_id=DEFAULT_USER):
+    store = get_store(user_id)
+    with _write_lock(user_id), metrics.timed("journal.append", kind="session"):
+        old_signature = _signature(store, ("sessions",))
+        old_all = _signature(store, ("sessions", "summaries"))
+        store.append_session(session)
+        new_signature = _signature(store, ("sessions",))
+        new_all = _signature(store, ("sessions", "summaries"))
+        cache.update((user_slug(user_id), "sessions"), old_signature, new_signature,
+                     lambda sessions: sessions + [session])
+        _update_metadata(user_id, old_all, new_all, lambda index: index.append_sessions([session]))
+    sync_search_index(user_id)
+
+
+# Function to save a summary and update the cache without re-reading the file
+def append_summary(summary_entry, user_id=DEFAULT_USER):
+    append_summaries([summary_entry], user_id)
+
+
+# Function to save several summaries in one write and update the cache
+def append_summaries(summary_entries, user_id=DEFAULT_USER):
+    if not summary_entries:
+        return
+    store = get_store(user_id)
+    with _write_lock(user_id), metrics.timed("journal.append", kind="summaries"):
+        old_signature = _signature(store, ("summaries",))
+        old_all = _signature(store, ("sessions", "summaries"))
+        store.append_summaries(summary_entries)
+        new_signature = _signature(store, ("summaries",))
+        new_all = _signature(store, ("sessions", "summaries"))
+        cache.update((user_slug(user_id), "summaries"), old_signature, new_signature,
+                     lambda summaries: summaries + list(summary_entries))
+        _update_metadata(user_id, old_all, new_all, lambda index: index.append_summaries(summary_entries))
+    sync_search_index(user_id)
@@ -0,0 +1,97 @@
+import json
+import streamlit as st
+import metrics
+
+# Hidden diagnostics page of the apps, opened with ?diagnostics=1 in the URL.
+# Shows the metrics collected by this process (see metrics): latency of every
+# operation, token use per agent, error rates and the modules' own counters,
+# with downloads in the Prometheus text and JSONL formats.
+
+TOKEN_COUNTERS = ("prompt_tokens_total", "response_tokens_total")
+
+
+def _ms(seconds):
+    return None if seconds is None else round(seconds * 1000, 1)
+
+
+def _labels_text(labels):
+    return ", ".join(f"{key}={value}" for key, value in labels.items())
+
+
+# Function to get the latency rows of the operations table
+def operation_rows(data):
+    return [
+        {
+            "operation": op["operation"],
+            "labels": _labels_text(op["labels"]),
+            "calls": op["count"],
+            "errors": op["errors"],
+            "error rate": f"{op['errors'] / op['count']:.1%}" if op["count"] else "",
+            "mean ms": _ms(op["sum"] / op["count"]) if op["count"] else None,
+            "p50 ms": _ms(op["p50"]),
+            "p95 ms": _ms(op["p95"]),
+            "p99 ms": _ms(op["p99"]),
+            "max ms": _ms(op["max"]),
+            "error types": _labels_text(op["error_types"]),
+        }
+        for op in data["operations"]
+    ]
+
+
+# Function to get prompt and response tokens per agent, with their model requests
+# and where the counts come from (the model's reported usage or an estimate)
+def token_rows(data):
+    rows = {}
+    sources = {}
+    for counter in data["counters"]:
+        if counter["name"] in TOKEN_COUNTERS:
+            agent = counter["labels"].get("agent", "")
+            row = rows.setdefault(agent, {"prompt tokens": 0, "response tokens": 0})
+            row["prompt tokens" if counter["name"] == "prompt_tokens_total" else "response tokens"] += counter["value"]
+            sources.setdefault(agent, set()).add(counter["labels"].get("source", "estimate"))
+    for agent, row in rows.items():
+        row["counted from"] = ", ".join(sorted(sources[agent]))
+    for op in data["operations"]:
+        if op["operation"] == "model.request" and op["labels"].get("agent", "") in rows:
+            row = rows[op["labels"]["agent"]]
+            row["requests"] = row.get("requests", 0) + op["count"]
+    return [{"agent": agent, **row} for agent, row in sorted(rows.items())]
+
+
+def render():
+    data = metrics.snapshot()
+    st.title("🩺 Diagnostics")
+    st.caption(f"Metrics of this app process over the last {data['uptime'] / 60:.0f} minutes. "
+               "Token counts are the usage the model reports; those counted from an estimate "
+               "(backends that report none, like the stub) assume about 4 characters per token.")
+
+    refresh, reset = st.columns(2)
+    refresh.button("🔄 Refresh", use_container_width=True)
+    reset.button("Reset metrics", on_click=metrics.reset, use_container_width=True)
+
+    st.subheader("Latency")
+    if data["operations"]:
+        st.dataframe(operation_rows(data), hide_index=True)
+    else:
+        st.info("Nothing timed yet.")
+
+    st.subheader("Tokens")
+    tokens = token_rows(data)
+    if tokens:
+        st.dataframe(tokens, hide_index=True)
+    else:
+        st.info("No model calls yet.")
+
+    st.subheader("Counters")
+    counters = [{"name": c["name"], "labels": _labels_text(c["labels"]), "value": c["value"]}
+                for c in data["counters"] + data["gauges"] if c["name"] not in TOKEN_COUNTERS]
+    if counters:
+        st.dataframe(counters, hide_index=True)
+
+    prometheus, jsonl = st.columns(2)
+    prometheus.download_button("Download Prometheus text", metrics.prometheus_text(data),
+                               file_name="metrics.prom", mime="text/plain", use_container_width=True)
+    jsonl.download_button("Download JSONL snapshot", json.dumps(data, ensure_ascii=False) + "\n",
+                          file_name="metrics.jsonl", mime="application/jsonl", use_container_width=True)
+    if metrics.EXPORT_PATH:
+        st.caption(f"Also exported to {metrics.EXPORT_PATH} every {metrics.EXPORT_SECONDS:.0f}s.")
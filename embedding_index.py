@@ -0,0 +1,130 @@
+import json
+import os
+import re
+import threading
+import zlib
+import numpy as np
+from journal_store import DEFAULT_USER, user_path, user_slug
+
+# Vector index over summaries for "Letter from Past".
+#
+# Summaries are embedded once, as they are added, into a row-normalized NumPy
+# matrix saved next to the journal; retrieval is a single matrix-vector
+# product followed by a top-k selection. The embedding function is pluggable;
+# the default hashes words and word pairs into a fixed number of buckets, so
+# it works offline and never needs refitting as the journal grows.
+
+INDEX_PATH = "summary_index"
+HASH_DIM = 1024
+
+_WORD_RE = re.compile(r"[a-z']+")
+
+
+# Function to embed texts with the hashing trick (unigrams + bigrams, signed buckets)
+def hash_embed(texts, dim=HASH_DIM):
+    vectors = np.zeros((len(texts), dim), dtype=np.float32)
+    for row, text in enumerate(texts):
+        words = _WORD_RE.findall(text.lower())
+        features = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+        for feature in features:
+            h = zlib.crc32(feature.encode("utf-8"))
+            vectors[row, h % dim] += 1.0 if (h >> 31) & 1 else -1.0
+    # Sublinear term frequency, keeping the sign of each bucket
+    np.copysign(np.log1p(np.abs(vectors)), vectors, out=vectors)
+    return vectors
+
+
+# Function to embed texts with Gemini's embedding model (needs network access)
+def gemini_embed(texts):
+    import google.generativeai as genai
+    from llm import configure
+
+    configure()
+    result = genai.embed_content(model="models/text-embedding-004", content=list(texts))
+    return np.asarray(result["embedding"], dtype=np.float32)
+
+
+# Available embedding functions (EMBEDDING_BACKEND, default "hashing")
+EMBEDDERS = {
+    "hashing": hash_embed,
+    "gemini": gemini_embed,
+}
+
+
+def _normalize(vectors):
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+class EmbeddingIndex:
+    def __init__(self, path=INDEX_PATH, embedder=None):
+        self.path = path
+        self.embedder = embedder or os.environ.get("EMBEDDING_BACKEND", "hashing")
+        self.embed = EMBEDDERS[self.embedder]
+        self.matrix = None
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.path + ".json", "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            matrix = np.load(self.path + ".npy")
+        except (FileNotFoundError, ValueError):
+            return
+        # An index built by another embedder is rebuilt from scratch
+        if meta.get("embedder") == self.embedder and meta.get("count") == len(matrix):
+            self.matrix = matrix
+
+    def _save(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(self.path + ".npy.tmp", "wb") as f:
+            np.save(f, self.matrix)
+        os.replace(self.path + ".npy.tmp", self.path + ".npy")
+        with open(self.path + ".json.tmp", "w", encoding="utf-8") as f:
+            json.dump({"embedder": self.embedder, "count": len(self.matrix)}, f)
+        os.replace(self.path + ".json.tmp", self.path + ".json")
+
+    def __len__(self):
+        return 0 if self.matrix is None else len(self.matrix)
+
+    # Embed the summaries added since the last sync (the summary store is append-only)
+    def sync(self, summaries):
+        with self._lock:
+            if len(summaries) < len(self):
+                self.matrix = None
+            new = summaries[len(self):]
+            if not new:
+                return
+            vectors = _normalize(self.embed([s.get("summary", "") for s in new]))
+            self.matrix = vectors if self.matrix is None else np.vstack([self.matrix, vectors])
+            self._save()
+
+    # Return [(row, score)] of the k rows most similar to text, best first
+    def top_k(self, text, k=5, exclude=(), min_score=0.0):
+        with self._lock:
+            if not len(self):
+                return []
+            query = _normalize(self.embed([text]))[0]
+            scores = self.matrix @ query
+        for row in exclude:
+            if 0 <= row < len(scores):
+                scores[row] = -np.inf
+        k = min(k, len(scores))
+        rows = np.argpartition(-scores, k - 1)[:k]
+        rows = rows[np.argsort(-scores[rows])]
+        return [(int(row), float(scores[row])) for row in rows if scores[row] >= min_score]
+
+
+_indexes = {}
+_index_lock = threading.Lock()
+
+
+# Function to get the process-wide summary index of a user
+def get_summary_index(user_id=DEFAULT_USER):
+    user_id = user_slug(user_id)
+    with _index_lock:
+        if user_id not in _indexes:
+            _indexes[user_id] = EmbeddingIndex(user_path(user_id, INDEX_PATH))
+        return _indexes[user_id]
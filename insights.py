@@ -0,0 +1,137 @@
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import data_access
+import metrics
+from agents import INSIGHTS_AGENT
+from journal_store import DEFAULT_USER, file_lock, parse_timestamp, user_path, write_json
+
+# Reflective insights for the summary view.
+#
+# Insights are refreshed by a background job after each new summary and saved
+# next to the journal with their watermark (the number of summaries already
+# folded in; the summary store is append-only), so the summary view reads them
+# from disk instantly. A refresh sends the previous insights plus only the
+# summaries past the watermark, never the whole history again. A failed
+# refresh is not tried again until more summaries arrive or retry() is called.
+
+INSIGHTS_PATH = "insights.json"
+
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="insights")
+_lock = threading.Lock()
+_running = {}
+# Number of summaries each running refresh was scheduled for
+_counts = {}
+# Users with summaries added while their refresh was running
+_again = set()
+# Last failure per user: (number of summaries it was for, error message)
+_errors = {}
+
+
+def _empty_state():
+    return {"watermark": 0, "insights": [], "updated": None}
+
+
+# Function to load a user's saved insights
+def load(user_id=DEFAULT_USER):
+    path = user_path(user_id, INSIGHTS_PATH)
+    if not os.path.exists(path):
+        return _empty_state()
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+# Function to build the insights prompt from the previous insights and the new summaries
+def build_prompt(state, new_summaries):
+    sections = []
+    if state["insights"]:
+        sections.append("Current insights (update them with the new summaries):\n"
+                        + "\n".join(f"- {insight}" for insight in state["insights"]))
+    sections.append("New journal summaries:\n\n" + "\n\n".join(
+        f"Date: {parse_timestamp(s['timestamp']).strftime('%Y-%m-%d')}\nSummary: {s['summary']}"
+        for s in new_summaries
+    ))
+    return "\n\n".join(sections)
+
+
+# Function to turn the model's bullet points into a list of insights
+def parse_insights(text):
+    return [line.strip().lstrip("-*• ").strip() for line in text.strip().split("\n") if line.strip()]
+
+
+# Function to fold summaries past the watermark into the user's insights.
+# Returns the saved state; no model call is made when nothing is new.
+def refresh(user_id=DEFAULT_USER):
+    path = user_path(user_id, INSIGHTS_PATH)
+    summaries = data_access.load_summaries(user_id)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with file_lock(path):
+        state = load(user_id)
+        new = [s for s in summaries[state["watermark"]:] if s.get("summary")]
+        if new:
+            insights = parse_insights(INSIGHTS_AGENT.generate(build_prompt(state, new), user_id=user_id))
+            state = {
+                "watermark": len(summaries),
+                "insights": insights or state["insights"],
+                "updated": datetime.now().isoformat(),
+            }
+            write_json(path, state)
+        elif state["watermark"] != len(summaries):
+            state["watermark"] = len(summaries)
+            write_json(path, state)
+    return state
+
+
+def _run(user_id):
+    while True:
+        with _lock:
+            count = _counts[user_id]
+        try:
+            with metrics.timed("insights.refresh"):
+                refresh(user_id)
+            _errors.pop(user_id, None)
+        except Exception as e:
+            _errors[user_id] = (count, str(e))
+        with _lock:
+            if user_id not in _again:
+                _running.pop(user_id, None)
+                return
+            _again.discard(user_id)
+
+
+# Function to refresh a user's insights in the background (at most one refresh
+# per user at a time). Does nothing if the last refresh failed and no summaries
+# were added since.
+def schedule(user_id=DEFAULT_USER):
+    count = len(data_access.load_summaries(user_id))
+    with _lock:
+        if user_id in _running:
+            # Only summaries added since the running refresh started need another pass
+            if count > _counts[user_id]:
+                _counts[user_id] = count
+                _again.add(user_id)
+            return
+        if user_id in _errors and _errors[user_id][0] >= count:
+            return
+        _counts[user_id] = count
+        _running[user_id] = _executor.submit(_run, user_id)
+
+
+# Function to try a failed refresh again
+def retry(user_id=DEFAULT_USER):
+    _errors.pop(user_id, None)
+    schedule(user_id)
+
+
+# Function to check whether a user's insights are being refreshed
+def is_refreshing(user_id=DEFAULT_USER):
+    with _lock:
+        return user_id in _running
+
+
+# Function to get the error of a user's last refresh (None if it worked)
+def last_error(user_id=DEFAULT_USER):
+    error = _errors.get(user_id)
+    return error[1] if error else None
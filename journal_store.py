@@ -0,0 +1,565 @@
+import os
+import re
+import json
+import shutil
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# Legacy file paths (whole JSON arrays, rewritten on every save)
+JOURNAL_LOG = "journal_entries.json"
+SUMMARY_PATH = "journal_summary.json"
+
+# Top-level append-only logs of earlier versions (one JSON record per line, read only)
+JOURNAL_JSONL = "journal_entries.jsonl"
+SUMMARY_JSONL = "journal_summary.jsonl"
+
+# SQLite database path
+JOURNAL_DB = "journal.db"
+
+# Per-user storage: every user has a directory under USERS_DIR.
+# The default user starts from the journal files at the top level.
+USERS_DIR = "users"
+DEFAULT_USER = "default"
+
+# Lock files of the running processes (see process_owner)
+PROCESS_LOCKS_DIR = "process_locks"
+# Id of this process in records it owns, unique across restarts
+PROCESS_ID = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+
+
+# Function to parse a stored ISO timestamp, accepting a trailing "Z"
+def parse_timestamp(timestamp):
+    if timestamp.endswith("Z"):
+        timestamp = timestamp[:-1] + "+00:00"
+    return datetime.fromisoformat(timestamp)
+
+
+# Context manager holding an exclusive advisory lock on path + ".lock".
+# The lock is taken through a new file handle each time, so it excludes other
+# threads as well as other processes, and must not be taken twice by one thread.
+@contextmanager
+def file_lock(path):
+    with open(path + ".lock", "a+b") as f:
+        _lock_file(f)
+        try:
+            yield
+        finally:
+            _unlock_file(f)
+
+
+# Function to lock an open lock file; with blocking=False, returns False at once if it is held
+def _lock_file(f, blocking=True):
+    if fcntl:
+        try:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return False
+        return True
+    f.seek(0)
+    while True:
+        try:
+            msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+            return True
+        except OSError:
+            if not blocking:
+                return False
+            time.sleep(0.01)
+
+
+def _unlock_file(f):
+    if fcntl:
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+    else:
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+_process_lock = None
+_process_lock_guard = threading.Lock()
+
+
+# Function to get this process's id for the records it owns (claimed jobs, open
+# chats). The first call locks the process's lock file for the rest of its life,
+# and the OS drops that lock when the process exits or crashes.
+def process_owner():
+    global _process_lock
+    with _process_lock_guard:
+        if _process_lock is None:
+            os.makedirs(PROCESS_LOCKS_DIR, exist_ok=True)
+            f = open(os.path.join(PROCESS_LOCKS_DIR, PROCESS_ID + ".lock"), "a+b")
+            _lock_file(f)
+            _process_lock = f
+    return PROCESS_ID
+
+
+# Function to tell whether the process that owns a record is still running
+def owner_alive(owner):
+    if owner == PROCESS_ID:
+        return True
+    path = os.path.join(PROCESS_LOCKS_DIR, f"{owner}.lock")
+    try:
+        f = open(path, "r+b")
+    except (FileNotFoundError, TypeError):
+        return False
+    with f:
+        if not _lock_file(f, blocking=False):
+            return True
+        _unlock_file(f)
+    # The owner is gone: its lock file is no longer needed
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+    return False
+
+
+# Function to get a temp file name next to path that no other writer uses
+def _tmp_path(path):
+    return f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+
+
+# Function to read a JSON array file, returning an empty list if it is missing
+def read_json_array(path):
+    if not os.path.exists(path):
+        return []
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+# Function to read every complete record from a JSONL log.
+# A torn last line (crash in the middle of an append) is skipped.
+def read_jsonl(path):
+    records = []
+    if not os.path.exists(path):
+        return records
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                records.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue
+    return records
+
+
+# Function to append one record to a JSONL log and fsync it to disk
+def append_jsonl(path, record):
+    append_jsonl_batch(path, [record])
+
+
+# Function to append several records to a JSONL log with a single write and fsync.
+# The log's lock keeps appends from interleaving with each other or with a rewrite.
+def append_jsonl_batch(path, records):
+    data = "".join(json.dumps(record, ensure_ascii=False) + "\n" for record in records).encode("utf-8")
+    with file_lock(path), open(path, "a+b") as f:
+        # Terminate a torn line first so it cannot swallow these records
+        if f.seek(0, os.SEEK_END) > 0:
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) != b"\n":
+                data = b"\n" + data
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+
+
+# Function to replace a file with new records through a temp file and rename.
+# A read-modify-write must hold file_lock(path) around the read and this call.
+def write_jsonl(path, records):
+    tmp_path = _tmp_path(path)
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        for record in records:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+# Function to replace a JSON file through a temp file and rename
+def write_json(path, data):
+    tmp_path = _tmp_path(path)
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+# Function to turn a user name into a safe directory name
+def user_slug(user_id):
+    slug = re.sub(r"[^a-z0-9_-]+", "-", str(user_id).strip().lower()).strip("-")[:64]
+    if not slug:
+        raise ValueError(f"Invalid user id: {user_id!r}")
+    return slug
+
+
+# Function to get the path of a user's file (or directory when name is omitted)
+def user_path(user_id, name=None, root=USERS_DIR):
+    directory = os.path.join(root, user_slug(user_id))
+    return os.path.join(directory, name) if name else directory
+
+
+# Function to list the users with a storage directory
+def list_users(root=USERS_DIR):
+    if not os.path.isdir(root):
+        return []
+    return sorted(name for name in os.listdir(root) if os.path.isdir(os.path.join(root, name)))
+
+
+# Base of the file stores. They have no indexed queries: every read parses the
+# whole file, so data_access serves lists, pages and counts from its cache.
+class FileStore:
+    indexed_queries = False
+
+    # Files whose mtime/size change when sessions or summaries change
+    def paths(self, kind):
+        return [self.journal_path] if kind == "sessions" else [self.summary_path]
+
+
+# Original storage: every save re-reads and rewrites the whole JSON array,
+# under the file's lock and through a temp file and rename
+class JsonArrayStore(FileStore):
+    def __init__(self, journal_path=JOURNAL_LOG, summary_path=SUMMARY_PATH):
+        self.journal_path = journal_path
+        self.summary_path = summary_path
+
+    def load_sessions(self):
+        return read_json_array(self.journal_path)
+
+    def append_session(self, session):
+        with file_lock(self.journal_path):
+            sessions = read_json_array(self.journal_path)
+            sessions.append(session)
+            write_json(self.journal_path, sessions)
+
+    def load_summaries(self):
+        return read_json_array(self.summary_path)
+
+    def append_summary(self, summary_entry):
+        self.append_summaries([summary_entry])
+
+    def append_summaries(self, summary_entries):
+        with file_lock(self.summary_path):
+            summaries = read_json_array(self.summary_path)
+            summaries.extend(summary_entries)
+            write_json(self.summary_path, summaries)
+
+
+# Top-level append-only logs written by earlier versions. Only read now: like
+# the JSON array files, they seed the default user's store (see legacy_store).
+class JsonlStore(FileStore):
+    def __init__(self, journal_path=JOURNAL_JSONL, summary_path=SUMMARY_JSONL):
+        self.journal_path = journal_path
+        self.summary_path = summary_path
+
+    def load_sessions(self):
+        return read_jsonl(self.journal_path)
+
+    def load_summaries(self):
+        return read_jsonl(self.summary_path)
+
+
+# Append-only storage split into monthly segments, e.g. sessions/2025-04.jsonl.
+# A record goes to the segment of the month it is written in, so reading the
+# segments in name order gives the records in the order they were saved.
+class ShardedJsonlStore(FileStore):
+    def __init__(self, directory, import_from=None):
+        self.directory = directory
+        self.dirs = {
+            "sessions": os.path.join(directory, "sessions"),
+            "summaries": os.path.join(directory, "summaries"),
+        }
+        # The sessions directory marks a finished import; checked again under
+        # the lock, so only one process imports
+        if import_from is not None and not os.path.exists(self.dirs["sessions"]):
+            os.makedirs(directory, exist_ok=True)
+            with file_lock(os.path.join(directory, "import")):
+                if not os.path.exists(self.dirs["sessions"]):
+                    self.import_records(import_from)
+        for path in self.dirs.values():
+            os.makedirs(path, exist_ok=True)
+
+    # Import existing sessions and summaries, segmented by their own month.
+    # Sessions are written aside and renamed into place last, so an interrupted
+    # import is done again from the start.
+    def import_records(self, source):
+        sessions_tmp = self.dirs["sessions"] + ".import"
+        shutil.rmtree(sessions_tmp, ignore_errors=True)
+        for directory, records, key in (
+            (self.dirs["summaries"], source.load_summaries(), "timestamp"),
+            (sessions_tmp, source.load_sessions(), "session_timestamp"),
+        ):
+            os.makedirs(directory, exist_ok=True)
+            segments = {}
+            for record in records:
+                month = parse_timestamp(record[key]).strftime("%Y-%m")
+                segments.setdefault(month, []).append(record)
+            for month, segment in segments.items():
+                write_jsonl(os.path.join(directory, month + ".jsonl"), segment)
+        os.rename(sessions_tmp, self.dirs["sessions"])
+
+    def _segments(self, kind):
+        names = sorted(n for n in os.listdir(self.dirs[kind]) if n.endswith(".jsonl"))
+        return [os.path.join(self.dirs[kind], name) for name in names]
+
+    def _load(self, kind):
+        records = []
+        for path in self._segments(kind):
+            records.extend(read_jsonl(path))
+        return records
+
+    def _append(self, kind, records):
+        segment = os.path.join(self.dirs[kind], datetime.now().strftime("%Y-%m") + ".jsonl")
+        append_jsonl_batch(segment, records)
+
+    def load_sessions(self):
+        return self._load("sessions")
+
+    def append_session(self, session):
+        self._append("sessions", [session])
+
+    def load_summaries(self):
+        return self._load("summaries")
+
+    def append_summary(self, summary_entry):
+        self._append("summaries", [summary_entry])
+
+    def append_summaries(self, summary_entries):
+        self._append("summaries", summary_entries)
+
+    # The directory changes when a new segment is created
+    def paths(self, kind):
+        return [self.dirs[kind]] + self._segments(kind)
+
+
+# SQLite storage: sessions, entries and summaries with indexed timestamps.
+# Keys other than the indexed columns are kept in an "extra" JSON column.
+# The latest summary, summary pages and counts are single indexed queries,
+# which data_access uses instead of loading whole lists.
+class SqliteStore:
+    indexed_queries = True
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS sessions (
+        id INTEGER PRIMARY KEY,
+        session_timestamp TEXT NOT NULL,
+        extra TEXT
+    );
+    CREATE TABLE IF NOT EXISTS entries (
+        id INTEGER PRIMARY KEY,
+        session_id INTEGER NOT NULL REFERENCES sessions(id),
+        timestamp TEXT,
+        user_input TEXT,
+        mentor_response TEXT,
+        extra TEXT
+    );
+    CREATE TABLE IF NOT EXISTS summaries (
+        id INTEGER PRIMARY KEY,
+        timestamp TEXT NOT NULL,
+        summary TEXT,
+        extra TEXT
+    );
+    CREATE INDEX IF NOT EXISTS idx_sessions_timestamp ON sessions(session_timestamp);
+    CREATE INDEX IF NOT EXISTS idx_entries_session ON entries(session_id);
+    CREATE INDEX IF NOT EXISTS idx_entries_timestamp ON entries(timestamp);
+    CREATE INDEX IF NOT EXISTS idx_summaries_timestamp ON summaries(timestamp);
+    """
+
+    def __init__(self, db_path=JOURNAL_DB, import_from=None, import_legacy=True):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        # One process at a time creates the database and imports into it
+        with file_lock(db_path):
+            self.conn = sqlite3.connect(db_path, check_same_thread=False)
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.executescript(self.SCHEMA)
+            if (import_from is not None or import_legacy) and self._needs_import():
+                self.import_json(import_from)
+
+    # An empty database that was never imported into (user_version marks the import,
+    # so one interrupted before its commit is done again)
+    def _needs_import(self):
+        if self.conn.execute("PRAGMA user_version").fetchone()[0]:
+            return False
+        return not self.conn.execute(
+            "SELECT EXISTS (SELECT 1 FROM sessions) OR EXISTS (SELECT 1 FROM summaries)"
+        ).fetchone()[0]
+
+    # Import existing sessions and summaries (the top-level journal files by default)
+    def import_json(self, source=None):
+        if source is None:
+            source = legacy_store()
+        with self._lock, self.conn:
+            for session in source.load_sessions():
+                self._insert_session(session)
+            for summary_entry in source.load_summaries():
+                self._insert_summary(summary_entry)
+            self.conn.execute("PRAGMA user_version = 1")
+
+    def _insert_session(self, session):
+        extra = {k: v for k, v in session.items() if k not in ("session_timestamp", "entries")}
+        cursor = self.conn.execute(
+            "INSERT INTO sessions (session_timestamp, extra) VALUES (?, ?)",
+            (session["session_timestamp"], json.dumps(extra) if extra else None),
+        )
+        session_id = cursor.lastrowid
+        for entry in session.get("entries", []):
+            entry_extra = {
+                k: v for k, v in entry.items()
+                if k not in ("timestamp", "user_input", "mentor_response")
+            }
+            self.conn.execute(
+                "INSERT INTO entries (session_id, timestamp, user_input, mentor_response, extra) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (session_id, entry.get("timestamp"), entry.get("user_input"),
+                 entry.get("mentor_response"), json.dumps(entry_extra) if entry_extra else None),
+            )
+
+    def _insert_summary(self, summary_entry):
+        extra = {k: v for k, v in summary_entry.items() if k not in ("timestamp", "summary")}
+        self.conn.execute(
+            "INSERT INTO summaries (timestamp, summary, extra) VALUES (?, ?, ?)",
+            (summary_entry["timestamp"], summary_entry.get("summary"),
+             json.dumps(extra) if extra else None),
+        )
+
+    def _sessions_from_rows(self, rows):
+        if not rows:
+            return []
+        ids = [row[0] for row in rows]
+        entries_by_session = {session_id: [] for session_id in ids}
+        placeholders = ",".join("?" * len(ids))
+        entry_rows = self.conn.execute(
+            f"SELECT session_id, timestamp, user_input, mentor_response, extra FROM entries "
+            f"WHERE session_id IN ({placeholders}) ORDER BY id",
+            ids,
+        ).fetchall()
+        for session_id, timestamp, user_input, mentor_response, extra in entry_rows:
+            entry = {"timestamp": timestamp, "user_input": user_input}
+            if mentor_response is not None:
+                entry["mentor_response"] = mentor_response
+            if extra:
+                entry.update(json.loads(extra))
+            entries_by_session[session_id].append(entry)
+
+        sessions = []
+        for session_id, session_timestamp, extra in rows:
+            session = {"session_timestamp": session_timestamp, "entries": entries_by_session[session_id]}
+            if extra:
+                session.update(json.loads(extra))
+            sessions.append(session)
+        return sessions
+
+    def _summaries_from_rows(self, rows):
+        summaries = []
+        for timestamp, summary, extra in rows:
+            summary_entry = {"timestamp": timestamp, "summary": summary}
+            if extra:
+                summary_entry.update(json.loads(extra))
+            summaries.append(summary_entry)
+        return summaries
+
+    def load_sessions(self):
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT id, session_timestamp, extra FROM sessions ORDER BY id"
+            ).fetchall()
+            return self._sessions_from_rows(rows)
+
+    def append_session(self, session):
+        with self._lock, self.conn:
+            self._insert_session(session)
+
+    def load_summaries(self):
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT timestamp, summary, extra FROM summaries ORDER BY id"
+            ).fetchall()
+            return self._summaries_from_rows(rows)
+
+    def append_summary(self, summary_entry):
+        self.append_summaries([summary_entry])
+
+    def append_summaries(self, summary_entries):
+        with self._lock, self.conn:
+            for summary_entry in summary_entries:
+                self._insert_summary(summary_entry)
+
+    def latest_summary(self):
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT timestamp, summary, extra FROM summaries ORDER BY timestamp DESC, id DESC LIMIT 1"
+            ).fetchall()
+        summaries = self._summaries_from_rows(rows)
+        return summaries[0] if summaries else None
+
+    def page_summaries(self, offset=0, limit=10):
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT timestamp, summary, extra FROM summaries ORDER BY id DESC LIMIT ? OFFSET ?",
+                (limit, offset),
+            ).fetchall()
+        return self._summaries_from_rows(rows)
+
+    def count_summaries(self):
+        with self._lock:
+            return self.conn.execute("SELECT COUNT(*) FROM summaries").fetchone()[0]
+
+    def paths(self, kind):
+        return [self.db_path, self.db_path + "-wal"]
+
+
+# Function to open the single-user journal files at the top level
+# (JSONL logs first, then legacy JSON arrays)
+def legacy_store():
+    if os.path.exists(JOURNAL_JSONL) or os.path.exists(SUMMARY_JSONL):
+        return JsonlStore()
+    return JsonArrayStore()
+
+
+# Function to open a user's JSON array store
+def _open_json(directory, import_from):
+    os.makedirs(directory, exist_ok=True)
+    store = JsonArrayStore(os.path.join(directory, JOURNAL_LOG), os.path.join(directory, SUMMARY_PATH))
+    if import_from is not None and not os.path.exists(store.journal_path):
+        # The journal file marks a finished import, so it is written last, under its lock
+        with file_lock(store.journal_path):
+            if not os.path.exists(store.journal_path):
+                write_json(store.summary_path, import_from.load_summaries())
+                write_json(store.journal_path, import_from.load_sessions())
+    return store
+
+
+# Function to open a user's SQLite store (one database per user)
+def _open_sqlite(directory, import_from):
+    os.makedirs(directory, exist_ok=True)
+    return SqliteStore(os.path.join(directory, JOURNAL_DB), import_from=import_from, import_legacy=False)
+
+
+# Available storage backends, each opened on a user's directory
+BACKENDS = {
+    "json": _open_json,
+    "jsonl": ShardedJsonlStore,
+    "sqlite": _open_sqlite,
+}
+
+
+# Function to open a user's journal store (JOURNAL_BACKEND, default "jsonl").
+# The default user's store is seeded from the top-level journal files on first use.
+def open_store(backend=None, user_id=DEFAULT_USER):
+    backend = backend or os.environ.get("JOURNAL_BACKEND", "jsonl")
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown journal backend: {backend}")
+    import_from = legacy_store() if user_slug(user_id) == DEFAULT_USER else None
+    return BACKENDS[backend](user_path(user_id), import_from)
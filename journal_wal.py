@@ -0,0 +1,280 @@
+import glob
+import json
+import os
+import threading
+import uuid
+from datetime import datetime
+import data_access
+import metrics
+from journal_store import file_lock, list_users, owner_alive, process_owner, user_path
+
+# Write-ahead log of chats that are not saved as a session yet.
+#
+# Every Echo chat message is appended here as a JSON record the moment it is
+# sent or received, so a crash or a closed tab never loses it:
+#   begin   - a chat started (chat_id, time, owner: the process writing it)
+#   message - one message (role "user" or "echo", text)
+#   commit  - the chat is being saved as the session with session_timestamp
+#   end     - the chat is saved (or had nothing to save)
+# Records go through one long-lived O_APPEND handle per user, one write per
+# batch so processes never interleave lines; fsync is batched by a background
+# flusher every FSYNC_INTERVAL seconds (commit records are synced at once).
+# Segments rotate at SEGMENT_BYTES; after every rotation, the oldest full
+# segments whose chats have all ended are deleted, so a long-running server
+# keeps the log small. recover() replays chats that never ended into the journal,
+# skipping those whose owner process is still running (see journal_store.owner_alive).
+
+WAL_DIR = "wal"
+SEGMENT_BYTES = 1024 * 1024
+FSYNC_INTERVAL = 0.5
+
+# Record types
+BEGIN = "begin"
+MESSAGE = "message"
+COMMIT = "commit"
+END = "end"
+
+
+class WriteAheadLog:
+    def __init__(self, directory, segment_bytes=SEGMENT_BYTES, fsync_interval=FSYNC_INTERVAL):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.fsync_interval = fsync_interval
+        self._lock = threading.Lock()
+        self._fd = None
+        self._dirty = False
+        self._closed = threading.Event()
+        self._flusher = None
+        # Counts of appended batches and fsyncs, for diagnostics
+        self.writes = 0
+        self.fsyncs = 0
+
+    # Function to list the segment files, oldest first
+    def segments(self):
+        return sorted(glob.glob(os.path.join(self.directory, "*.jsonl")))
+
+    # Open the newest segment, starting a new one if it is full
+    def _open_segment(self):
+        os.makedirs(self.directory, exist_ok=True)
+        with file_lock(os.path.join(self.directory, "segments")):
+            segments = self.segments()
+            if segments and os.path.getsize(segments[-1]) < self.segment_bytes:
+                path = segments[-1]
+            else:
+                number = int(os.path.basename(segments[-1])[:-6]) + 1 if segments else 1
+                path = os.path.join(self.directory, f"{number:06d}.jsonl")
+            fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            # Terminate a line torn by a crash so it cannot swallow the next record
+            size = os.fstat(fd).st_size
+            if size:
+                with open(path, "rb") as f:
+                    f.seek(size - 1)
+                    if f.read(1) != b"\n":
+                        os.write(fd, b"\n")
+        return fd
+
+    def _fsync(self):
+        with metrics.timed("wal.fsync"):
+            os.fsync(self._fd)
+        self._dirty = False
+        self.fsyncs += 1
+
+    # Append records in one write; sync=True returns only once they are on disk
+    def append(self, records, sync=False):
+        data = "".join(json.dumps(record, ensure_ascii=False) + "\n" for record in records).encode("utf-8")
+        rotated = False
+        with self._lock:
+            if self._fd is not None and os.fstat(self._fd).st_size >= self.segment_bytes:
+                os.fsync(self._fd)
+                os.close(self._fd)
+                self._fd = None
+                rotated = True
+            if self._fd is None:
+                self._fd = self._open_segment()
+            with metrics.timed("wal.write"):
+                os.write(self._fd, data)
+            self.writes += 1
+            if sync or not self.fsync_interval:
+                self._fsync()
+            else:
+                self._dirty = True
+                if self._flusher is None:
+                    self._flusher = threading.Thread(target=self._flush_loop, name="wal-flush", daemon=True)
+                    self._flusher.start()
+        if rotated:
+            self.compact()
+
+    def _flush_loop(self):
+        while not self._closed.wait(self.fsync_interval):
+            self.flush()
+
+    # Function to force everything appended so far to disk
+    def flush(self):
+        with self._lock:
+            if self._fd is not None and self._dirty:
+                self._fsync()
+
+    # Function to read every record, oldest first (lines torn by a crash are skipped)
+    def read(self):
+        records = []
+        for path in self.segments():
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        records.append(json.loads(line))
+                    except ValueError:
+                        continue
+        return records
+
+    # Function to delete the oldest full segments whose chats have all ended.
+    # Deletion stops at the first segment still needed: deleting a later one
+    # could drop the end record of a chat that began in a kept segment.
+    def compact(self):
+        with self._lock, file_lock(os.path.join(self.directory, "segments")):
+            segments = self.segments()
+            ended = {r["chat_id"] for r in self.read() if r.get("type") == END}
+            removed = 0
+            for path in segments[:-1]:
+                with open(path, "r", encoding="utf-8") as f:
+                    chats = set()
+                    for line in f:
+                        try:
+                            chats.add(json.loads(line)["chat_id"])
+                        except (ValueError, KeyError):
+                            continue
+                if not chats <= ended:
+                    break
+                os.remove(path)
+                removed += 1
+            return removed
+
+    def close(self):
+        self._closed.set()
+        with self._lock:
+            if self._fd is not None:
+                if self._dirty:
+                    self._fsync()
+                os.close(self._fd)
+                self._fd = None
+
+
+_logs = {}
+_logs_lock = threading.Lock()
+_recovered = False
+
+
+def _counts():
+    with _logs_lock:
+        logs = list(_logs.values())
+    return [("wal_writes_total", {}, sum(log.writes for log in logs)),
+            ("wal_fsyncs_total", {}, sum(log.fsyncs for log in logs))]
+
+
+metrics.register_collector(_counts)
+
+
+# Function to get the process-wide write-ahead log of a user
+def get_log(user_id):
+    with _logs_lock:
+        if user_id not in _logs:
+            _logs[user_id] = WriteAheadLog(user_path(user_id, WAL_DIR))
+        return _logs[user_id]
+
+
+def _now():
+    return datetime.now().isoformat()
+
+
+# Function to start logging a chat, returning its id
+def begin_chat(user_id, kind="echo"):
+    chat_id = uuid.uuid4().hex
+    get_log(user_id).append([{"type": BEGIN, "chat_id": chat_id, "kind": kind, "time": _now(),
+                              "owner": process_owner()}])
+    return chat_id
+
+
+# Function to log one message of a chat
+def log_message(user_id, chat_id, role, text):
+    get_log(user_id).append([{"type": MESSAGE, "chat_id": chat_id, "role": role, "text": text, "time": _now()}])
+
+
+# Function to record that a chat is about to be saved as the session with session_timestamp
+def commit_chat(user_id, chat_id, session_timestamp):
+    get_log(user_id).append([{"type": COMMIT, "chat_id": chat_id, "session_timestamp": session_timestamp,
+                              "time": _now()}], sync=True)
+
+
+# Function to record that a chat is saved (or had nothing to save)
+def end_chat(user_id, chat_id):
+    get_log(user_id).append([{"type": END, "chat_id": chat_id, "time": _now()}])
+
+
+# Function to turn a chat's messages into session entries: each user message
+# with the Echo reply that followed it (if one arrived)
+def chat_entries(messages):
+    entries = []
+    for message in messages:
+        if message["role"] == "user":
+            entries.append({"timestamp": message["time"], "user_input": message["text"]})
+        elif entries and "mentor_response" not in entries[-1]:
+            entries[-1]["mentor_response"] = message["text"]
+    return entries
+
+
+# Function to find a user's chats that never ended, as {chat_id: {"begin", "commit", "messages"}}
+def unfinished_chats(records):
+    chats = {}
+    for record in records:
+        chat = chats.setdefault(record["chat_id"], {"begin": None, "commit": None, "messages": []})
+        if record["type"] == BEGIN:
+            chat["begin"] = record
+        elif record["type"] == MESSAGE:
+            chat["messages"].append(record)
+        elif record["type"] == COMMIT:
+            chat["commit"] = record
+        elif record["type"] == END:
+            chats[record["chat_id"]] = None
+    return {chat_id: chat for chat_id, chat in chats.items() if chat is not None}
+
+
+# Function to save a user's unfinished chats as sessions, returning how many were saved.
+# Chats still being written by a running process are left alone; processes
+# starting at once take turns, so a crashed chat is saved only once.
+def recover_user(user_id):
+    log = get_log(user_id)
+    with file_lock(os.path.join(log.directory, "recover")):
+        saved = _recover_chats(log, user_id)
+    log.compact()
+    return saved
+
+
+# Function to save the unfinished chats of a log whose owner is gone (a chat
+# whose begin record was lost to a crash has no owner left to wait for)
+def _recover_chats(log, user_id):
+    saved = 0
+    for chat_id, chat in unfinished_chats(log.read()).items():
+        if chat["begin"] and owner_alive(chat["begin"].get("owner")):
+            continue
+        entries = chat_entries(chat["messages"])
+        if entries:
+            # A commit means the save may already have happened before the crash
+            if chat["commit"]:
+                session_timestamp = chat["commit"]["session_timestamp"]
+            else:
+                session_timestamp = (chat["begin"] or chat["messages"][0])["time"]
+            if not any(s["session_timestamp"] == session_timestamp for s in data_access.load_sessions(user_id)):
+                data_access.append_session({"session_timestamp": session_timestamp, "entries": entries}, user_id)
+                saved += 1
+        log.append([{"type": END, "chat_id": chat_id, "time": _now(), "recovered": True}], sync=True)
+    return saved
+
+
+# Function to replay the chats left unfinished by a previous run (runs once per process)
+def recover():
+    global _recovered
+    with _logs_lock:
+        if _recovered:
+            return 0
+        _recovered = True
+    return sum(recover_user(user_id) for user_id in list_users()
+               if os.path.isdir(user_path(user_id, WAL_DIR)))
@@ -0,0 +1,258 @@
+import os
+import threading
+
+# Model used by every agent
+MODEL_NAME = "models/gemini-2.5-pro-exp-03-25"
+
+# Model configuration
+generation_config = {
+    "temperature": 1,
+    "top_p": 0.95,
+    "top_k": 64,
+    "max_output_tokens": 65536,
+    "response_mime_type": "text/plain",
+}
+
+# Models are built on first use and shared by every rerun and session of the
+# process, so the script itself never pays for the client import or setup.
+_models = {}
+_lock = threading.Lock()
+_configured = False
+
+
+# Function to configure the Gemini client once per process; the API key comes
+# from GEMINI_API_KEY (environment or a .env file), there is no default key
+def configure():
+    global _configured
+    with _lock:
+        if _configured:
+            return
+        # Deferred: google.generativeai is slow to import
+        import google.generativeai as genai
+        from dotenv import load_dotenv
+
+        load_dotenv()
+        api_key = os.environ.get("GEMINI_API_KEY")
+        if not api_key:
+            raise BackendError("GEMINI_API_KEY is not set: add it to the environment or a .env file "
+                               "(or set LLM_BACKEND=stub to run without Gemini)", retriable=False)
+        genai.configure(api_key=api_key)
+        _configured = True
+
+
+# Function to get the shared model for a name, configuration and system instruction
+def get_model(model_name=MODEL_NAME, system_instruction=None):
+    configure()
+    key = (model_name, system_instruction)
+    with _lock:
+        if key not in _models:
+            import google.generativeai as genai
+
+            _models[key] = genai.GenerativeModel(
+                model_name=model_name,
+                generation_config=generation_config,
+                system_instruction=system_instruction,
+            )
+        return _models[key]
+
+
+# Function to read a streamed response, calling on_text with the text so far
+# after every chunk, and return the full text
+def stream_text(response, on_text=None):
+    text = ""
+    for chunk in response:
+        if not chunk.parts:
+            continue
+        text += chunk.text
+        if on_text:
+            on_text(text)
+    return text
+
+
+# Raised by backends for a failed model call; retriable errors may be retried
+class BackendError(Exception):
+    def __init__(self, message, retriable=True):
+        super().__init__(message)
+        self.retriable = retriable
+
+
+# LLM backends share one interface:
+#   generate(contents, system_instruction, timeout, usage) -> full reply text
+#   stream(contents, system_instruction, timeout, usage)   -> iterator of text chunks
+#   count_tokens(contents, system_instruction)             -> prompt token count
+# where contents is a prompt string or a list of {"role", "parts"} messages.
+# A backend that knows the token usage of a reply fills the usage dict given
+# (prompt_tokens and response_tokens); one that does not leaves it empty.
+# Failed calls raise BackendError.
+
+# HTTP status codes worth retrying: rate limited, server errors and timeouts
+RETRIABLE_CODES = {408, 429, 500, 502, 503, 504}
+
+
+# Function to turn a Gemini client error into a BackendError
+def gemini_error(e):
+    if isinstance(e, (ConnectionError, TimeoutError)):
+        return BackendError(f"Gemini request failed: {e}", retriable=True)
+    code = getattr(e, "code", None)
+    return BackendError(f"Gemini request failed: {e}", retriable=code in RETRIABLE_CODES)
+
+
+# Function to copy the token counts Gemini reports with a response (or, when
+# streaming, with each chunk: the last one has the totals) into usage
+def _record_usage(response, usage):
+    metadata = getattr(response, "usage_metadata", None)
+    if usage is None or not metadata or not metadata.prompt_token_count:
+        return
+    usage["prompt_tokens"] = metadata.prompt_token_count
+    usage["response_tokens"] = metadata.candidates_token_count or 0
+
+
+# Gemini through google.generativeai
+class GeminiBackend:
+    name = "gemini"
+
+    def __init__(self, model_name=MODEL_NAME):
+        self.model_name = model_name
+
+    def _request_options(self, timeout):
+        return {"timeout": timeout} if timeout else None
+
+    def generate(self, contents, system_instruction=None, timeout=None, usage=None):
+        model = get_model(self.model_name, system_instruction=system_instruction)
+        try:
+            response = model.generate_content(contents, request_options=self._request_options(timeout))
+            _record_usage(response, usage)
+            return response.text
+        except BackendError:
+            raise
+        except Exception as e:
+            raise gemini_error(e) from e
+
+    def stream(self, contents, system_instruction=None, timeout=None, usage=None):
+        model = get_model(self.model_name, system_instruction=system_instruction)
+        try:
+            response = model.generate_content(contents, stream=True,
+                                              request_options=self._request_options(timeout))
+            for chunk in response:
+                _record_usage(chunk, usage)
+                if chunk.parts:
+                    yield chunk.text
+        except BackendError:
+            raise
+        except Exception as e:
+            raise gemini_error(e) from e
+
+    def count_tokens(self, contents, system_instruction=None):
+        model = get_model(self.model_name, system_instruction=system_instruction)
+        return model.count_tokens(contents).total_tokens
+
+
+# Function to flatten contents into plain text
+def contents_text(contents, system_instruction=None):
+    if isinstance(contents, str):
+        text = contents
+    else:
+        text = "\n".join(part for content in contents for part in content["parts"])
+    return (system_instruction + "\n" if system_instruction else "") + text
+
+
+# Deterministic offline backend for tests and benchmarks.
+# Replies are derived from a hash of the input; latency is a fixed delay plus
+# reply_tokens / tokens_per_second, and failure_rate of the calls raise BackendError.
+# It reports no token usage, so its tokens are counted as estimates.
+class StubBackend:
+    name = "stub"
+
+    def __init__(self, latency=0.05, tokens_per_second=200.0, reply_tokens=40,
+                 failure_rate=0.0, seed=0):
+        import random
+
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.reply_tokens = reply_tokens
+        self.failure_rate = failure_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _maybe_fail(self):
+        with self._lock:
+            failed = self._random.random() < self.failure_rate
+        if failed:
+            raise BackendError("stub backend: injected failure")
+
+    def _reply_words(self, contents, system_instruction):
+        import hashlib
+
+        text = contents_text(contents)
+        digest = hashlib.sha256(contents_text(contents, system_instruction).encode("utf-8")).hexdigest()
+        words = ["Stub", "reply", digest[:8], "to:"] + text.split()[:8]
+        while len(words) < self.reply_tokens:
+            words.append("lorem")
+        return words[:self.reply_tokens]
+
+    # Sleep like a request would, failing once the timeout is used up
+    def _wait(self, seconds, timeout):
+        import time
+
+        if timeout is not None and seconds > timeout:
+            time.sleep(max(timeout, 0))
+            raise BackendError("stub backend: timed out")
+        time.sleep(seconds)
+
+    def generate(self, contents, system_instruction=None, timeout=None, usage=None):
+        words = self._reply_words(contents, system_instruction)
+        self._wait(self.latency, timeout)
+        self._maybe_fail()
+        self._wait(len(words) / self.tokens_per_second, timeout and timeout - self.latency)
+        return " ".join(words)
+
+    def stream(self, contents, system_instruction=None, timeout=None, usage=None):
+        import time
+
+        self._wait(self.latency, timeout)
+        self._maybe_fail()
+        for i, word in enumerate(self._reply_words(contents, system_instruction)):
+            time.sleep(1 / self.tokens_per_second)
+            yield word if i == 0 else " " + word
+
+    def count_tokens(self, contents, system_instruction=None):
+        return len(contents_text(contents, system_instruction).split())
+
+
+# Function to build the stub backend from LLM_STUB_* environment variables
+def stub_from_env():
+    return StubBackend(
+        latency=float(os.environ.get("LLM_STUB_LATENCY", 0.05)),
+        tokens_per_second=float(os.environ.get("LLM_STUB_TOKENS_PER_SECOND", 200)),
+        reply_tokens=int(os.environ.get("LLM_STUB_REPLY_TOKENS", 40)),
+        failure_rate=float(os.environ.get("LLM_STUB_FAILURE_RATE", 0)),
+        seed=int(os.environ.get("LLM_STUB_SEED", 0)),
+    )
+
+
+# Available backends (LLM_BACKEND, default "gemini")
+BACKENDS = {
+    "gemini": GeminiBackend,
+    "stub": stub_from_env,
+}
+
+_backend = None
+
+
+# Function to get the process-wide backend
+def get_backend():
+    global _backend
+    with _lock:
+        if _backend is None:
+            name = os.environ.get("LLM_BACKEND", "gemini")
+            if name not in BACKENDS:
+                raise ValueError(f"Unknown LLM backend: {name}")
+            _backend = BACKENDS[name]()
+        return _backend
+
+
+# Function to replace the process-wide backend (e.g. with a configured stub)
+def set_backend(backend):
+    global _backend
+    with _lock:
+        _backend = backend
@@ -0,0 +1,221 @@
+import io
+import json
+import os
+import threading
+from datetime import datetime
+import numpy as np
+from journal_store import parse_timestamp
+from sentiment import EMOTIONS, score_texts
+
+# Columnar metadata of a user's sessions and summaries.
+#
+# One NumPy array per column, kept next to the journal and extended on every
+# write, so listings and stats never parse timestamps or read entry text:
+#   sessions:  time, entries, chars, words, summary (row or -1), mood (NaN if unknown)
+#   summaries: time, session (row or -1)
+#   entries:   session (row), valence, one share per emotion (see sentiment)
+# A session's mood is the mean valence of its entries, so mood charts and
+# trend queries are a few array reductions with no model call.
+# The file records the signature of the journal files it was built from; if
+# they changed behind its back (another process, a backfill) it is rebuilt.
+
+METADATA_PATH = "metadata.npz"
+
+SESSION_COLUMNS = {
+    "time": "datetime64[us]",
+    "entries": np.int32,
+    "chars": np.int32,
+    "words": np.int32,
+    "summary": np.int32,
+    "mood": np.float32,
+}
+SUMMARY_COLUMNS = {
+    "time": "datetime64[us]",
+    "session": np.int32,
+}
+ENTRY_COLUMNS = dict(
+    {"session": np.int32, "valence": np.float32},
+    **{emotion: np.float32 for emotion in EMOTIONS},
+)
+
+# Periods mood trends can be grouped by
+TREND_UNITS = {"day": "D", "week": "W", "month": "M"}
+
+
+def _time(timestamp):
+    return np.datetime64(parse_timestamp(timestamp).replace(tzinfo=None), "us")
+
+
+def _empty(columns):
+    return {name: np.empty(0, dtype=dtype) for name, dtype in columns.items()}
+
+
+class MetadataIndex:
+    def __init__(self, sessions=None, summaries=None, entries=None):
+        self.sessions = sessions or _empty(SESSION_COLUMNS)
+        self.summaries = summaries or _empty(SUMMARY_COLUMNS)
+        self.entries = entries or _empty(ENTRY_COLUMNS)
+
+    # Function to build the index from every session and summary
+    @classmethod
+    def build(cls, sessions, summaries):
+        index = cls()
+        index.append_sessions(sessions)
+        index.append_summaries(summaries)
+        return index
+
+    def session_count(self):
+        return len(self.sessions["time"])
+
+    def summary_count(self):
+        return len(self.summaries["time"])
+
+    def append_sessions(self, sessions):
+        if not sessions:
+            return self
+        rows = {name: [] for name in SESSION_COLUMNS}
+        all_texts, entry_sessions = [], []
+        for i, session in enumerate(sessions):
+            texts = [entry.get("user_input") or "" for entry in session.get("entries", [])]
+            rows["time"].append(_time(session["session_timestamp"]))
+            rows["entries"].append(len(texts))
+            rows["chars"].append(sum(len(text) for text in texts))
+            rows["words"].append(sum(len(text.split()) for text in texts))
+            rows["summary"].append(-1)
+            all_texts.extend(texts)
+            entry_sessions.extend([self.session_count() + i] * len(texts))
+
+        # Every new entry is scored in one batch; a session's mood is their mean
+        valence, emotions = score_texts(all_texts)
+        entry_sessions = np.array(entry_sessions, dtype=np.int32)
+        local = entry_sessions - self.session_count()
+        counts = np.bincount(local, minlength=len(sessions))
+        totals = np.bincount(local, weights=valence, minlength=len(sessions))
+        mood = np.full(len(sessions), np.nan, dtype=np.float32)
+        np.divide(totals, counts, out=mood, where=counts > 0, casting="unsafe")
+        rows["mood"] = mood
+
+        entry_rows = {"session": entry_sessions, "valence": valence}
+        entry_rows.update({emotion: emotions[:, i] for i, emotion in enumerate(EMOTIONS)})
+
+        # New arrays are swapped in at once, so readers never see half an update
+        self.sessions = {
+            name: np.concatenate([self.sessions[name], np.asarray(rows[name], dtype=dtype)])
+            for name, dtype in SESSION_COLUMNS.items()
+        }
+        self.entries = {
+            name: np.concatenate([self.entries[name], np.asarray(entry_rows[name], dtype=dtype)])
+            for name, dtype in ENTRY_COLUMNS.items()
+        }
+        return self
+
+    # Summaries point at their session by session_timestamp; older ones at the
+    # latest session started at or before the time they were written
+    def append_summaries(self, summaries):
+        if not summaries:
+            return self
+        session_times = self.sessions["time"]
+        summary_rows = self.sessions["summary"].copy()
+        times, links = [], []
+        for summary_entry in summaries:
+            time = _time(summary_entry["timestamp"])
+            if summary_entry.get("session_timestamp"):
+                matches = np.flatnonzero(session_times == _time(summary_entry["session_timestamp"]))
+                session = int(matches[-1]) if len(matches) else -1
+            else:
+                earlier = np.flatnonzero(session_times <= time)
+                session = int(earlier[np.argmax(session_times[earlier])]) if len(earlier) else -1
+            times.append(time)
+            links.append(session)
+            if session >= 0:
+                summary_rows[session] = self.summary_count() + len(times) - 1
+        self.summaries = {
+            "time": np.concatenate([self.summaries["time"], np.array(times, dtype="datetime64[us]")]),
+            "session": np.concatenate([self.summaries["session"], np.array(links, dtype=np.int32)]),
+        }
+        self.sessions = dict(self.sessions, summary=summary_rows)
+        return self
+
+    # Function to get (number, display date, entry count) of sessions [start, end), newest first
+    def session_rows(self, start, end):
+        return [
+            (row + 1, self.sessions["time"][row].astype(datetime).strftime("%B %d, %Y"),
+             int(self.sessions["entries"][row]))
+            for row in range(end - 1, start - 1, -1)
+        ]
+
+    # Function to get the display date of summary row
+    def summary_date(self, row):
+        return self.summaries["time"][row].astype(datetime).strftime("%B %d, %Y")
+
+    # Function to get the row of the most recent summary (None if there are none)
+    def latest_summary_row(self):
+        if not self.summary_count():
+            return None
+        # The last of equal times wins, like the newest write
+        times = self.summaries["time"]
+        return int(len(times) - 1 - np.argmax(times[::-1]))
+
+    # Function to get the mean mood per day/week/month as (period starts, moods), oldest first
+    def mood_trend(self, unit="day"):
+        scored = ~np.isnan(self.sessions["mood"])
+        if not scored.any():
+            return [], np.empty(0, dtype=np.float32)
+        times = self.sessions["time"][scored]
+        if unit == "week":
+            # NumPy weeks start on Thursday (1970-01-01 was one); start them on Monday instead
+            days = times.astype("datetime64[D]")
+            periods = days - (days.astype(np.int64) + 3) % 7
+        else:
+            periods = times.astype(f"datetime64[{TREND_UNITS[unit]}]")
+        starts, groups = np.unique(periods, return_inverse=True)
+        moods = np.bincount(groups, weights=self.sessions["mood"][scored]) / np.bincount(groups)
+        return [start.astype("datetime64[D]").astype(datetime) for start in starts], moods.astype(np.float32)
+
+    # Function to get the share of each emotion over the entries of sessions [start, end)
+    def emotion_shares(self, start=0, end=None):
+        end = self.session_count() if end is None else end
+        rows = (self.entries["session"] >= start) & (self.entries["session"] < end)
+        totals = np.array([self.entries[emotion][rows].sum() for emotion in EMOTIONS])
+        if totals.sum() > 0:
+            totals = totals / totals.sum()
+        return dict(zip(EMOTIONS, totals.tolist()))
+
+    def stats(self):
+        return {
+            "sessions": self.session_count(),
+            "entries": int(self.sessions["entries"].sum()),
+            "words": int(self.sessions["words"].sum()),
+            "chars": int(self.sessions["chars"].sum()),
+            "summarized": int((self.sessions["summary"] >= 0).sum()),
+            "summaries": self.summary_count(),
+            "mood": float(np.nanmean(self.sessions["mood"])) if (~np.isnan(self.sessions["mood"])).any() else None,
+        }
+
+    # Function to save the index with the signature of the files it reflects
+    def save(self, path, signature):
+        arrays = {f"session_{name}": column for name, column in self.sessions.items()}
+        arrays.update({f"summary_{name}": column for name, column in self.summaries.items()})
+        arrays.update({f"entry_{name}": column for name, column in self.entries.items()})
+        arrays["signature"] = np.array(json.dumps(signature))
+        buffer = io.BytesIO()
+        np.savez(buffer, **arrays)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(buffer.getvalue())
+        os.replace(tmp_path, path)
+
+    # Function to load a saved index, or None if it is missing or was built from other files
+    @classmethod
+    def load(cls, path, signature):
+        try:
+            with np.load(path) as data:
+                if json.loads(str(data["signature"])) != json.loads(json.dumps(signature)):
+                    return None
+                return cls(
+                    {name: data[f"session_{name}"] for name in SESSION_COLUMNS},
+                    {name: data[f"summary_{name}"] for name in SUMMARY_COLUMNS},
+                    {name: data[f"entry_{name}"] for name in ENTRY_COLUMNS},
+                )
+        except (FileNotFoundError, KeyError, ValueError, OSError):
+            return None
@@ -0,0 +1,265 @@
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+# Latency, token and error metrics of the app's operations.
+#
+# Model calls, journal loads and saves, searches and transcription are wrapped
+# in timed("operation", label=value); each operation and label set keeps a
+# latency histogram (fixed buckets) with its call and error counts. Counters
+# (prompt and response tokens, cache hits) are added with increment(), and
+# modules that already keep their own counts register a collector that reports
+# them on demand. Everything stays in process memory: recording is a
+# perf_counter pair and one locked update, cheap enough for hot paths.
+#
+# The numbers are shown on the hidden diagnostics page (?diagnostics=1 in the
+# app URL) and can be exported as Prometheus text or JSONL snapshots. With
+# METRICS_EXPORT_PATH set, a background thread exports to it every
+# METRICS_EXPORT_SECONDS: a *.jsonl path gets a snapshot appended, any other
+# path is rewritten in the Prometheus text format.
+
+# Upper bounds (seconds) of the latency buckets
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+EXPORT_PATH = os.environ.get("METRICS_EXPORT_PATH")
+EXPORT_SECONDS = float(os.environ.get("METRICS_EXPORT_SECONDS", 60))
+# Prefix of every exported Prometheus metric
+PROMETHEUS_PREFIX = "journal_"
+
+
+# Latency histogram: counts per bucket (the last one is everything slower)
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+        # Failed runs by exception type
+        self.errors = {}
+
+    def observe(self, seconds, error=None):
+        self.counts[bisect_left(self.buckets, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+        self.max = max(self.max, seconds)
+        if error is not None:
+            error_type = type(error).__name__
+            self.errors[error_type] = self.errors.get(error_type, 0) + 1
+
+    # Estimate a quantile by interpolating inside its bucket, like Prometheus' histogram_quantile
+    def quantile(self, q):
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            if count and seen + count >= rank:
+                lower = self.buckets[i - 1] if i else 0.0
+                upper = self.buckets[i] if i < len(self.buckets) else self.max
+                return min(lower + (upper - lower) * (rank - seen) / count, self.max)
+            seen += count
+        return self.max
+
+
+# Function to turn label keyword arguments into a hashable, ordered key
+def _labels(labels):
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.histograms = {}
+        self.counters = {}
+        self._collectors = []
+        self.started = time.time()
+
+    # Record one run of an operation; error is the exception it raised, if any
+    def observe(self, operation, seconds, error=None, **labels):
+        key = (operation, _labels(labels))
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.observe(seconds, error)
+
+    def increment(self, name, value=1, **labels):
+        key = (name, _labels(labels))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    # Register collector() -> [(name, labels dict, value)], read at every snapshot
+    def register_collector(self, collector):
+        with self._lock:
+            self._collectors.append(collector)
+
+    # Function to get every metric as plain data
+    def snapshot(self):
+        with self._lock:
+            operations = [
+                {
+                    "operation": operation,
+                    "labels": dict(labels),
+                    "count": histogram.count,
+                    "errors": sum(histogram.errors.values()),
+                    "error_types": dict(histogram.errors),
+                    "sum": histogram.sum,
+                    "max": histogram.max,
+                    "p50": histogram.quantile(0.5),
+                    "p95": histogram.quantile(0.95),
+                    "p99": histogram.quantile(0.99),
+                    "buckets": dict(zip([*map(str, histogram.buckets), "+Inf"], histogram.counts)),
+                }
+                for (operation, labels), histogram in sorted(self.histograms.items())
+            ]
+            counters = [{"name": name, "labels": dict(labels), "value": value}
+                        for (name, labels), value in sorted(self.counters.items())]
+            collectors = list(self._collectors)
+
+        gauges = []
+        for collector in collectors:
+            try:
+                gauges.extend({"name": name, "labels": dict(_labels(labels)), "value": value}
+                              for name, labels, value in collector())
+            except Exception:
+                continue
+        now = time.time()
+        return {"time": now, "uptime": now - self.started, "operations": operations,
+                "counters": counters, "gauges": gauges}
+
+    def reset(self):
+        with self._lock:
+            self.histograms.clear()
+            self.counters.clear()
+            self.started = time.time()
+
+
+registry = Registry()
+
+
+# Context manager (or decorator) timing an operation and counting its errors.
+# Exceptions pass through; only Exception subclasses count as errors, so a
+# Streamlit rerun interrupting a call is not recorded at all.
+@contextmanager
+def timed(operation, **labels):
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception as e:
+        registry.observe(operation, time.perf_counter() - start, e, **labels)
+        raise
+    registry.observe(operation, time.perf_counter() - start, **labels)
+
+
+# Function to record an operation timed elsewhere
+def observe(operation, seconds, error=None, **labels):
+    registry.observe(operation, seconds, error, **labels)
+
+
+# Function to add to a counter
+def increment(name, value=1, **labels):
+    registry.increment(name, value, **labels)
+
+
+# Function to report counts a module already keeps: collector() -> [(name, labels dict, value)]
+def register_collector(collector):
+    registry.register_collector(collector)
+
+
+def snapshot():
+    return registry.snapshot()
+
+
+def reset():
+    registry.reset()
+
+
+def _prometheus_name(name):
+    return PROMETHEUS_PREFIX + "".join(c if c.isalnum() else "_" for c in name)
+
+
+def _prometheus_labels(labels, **extra):
+    labels = {**labels, **extra}
+    if not labels:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+               for value in labels.values())
+    return "{" + ",".join(f'{key}="{value}"' for key, value in zip(labels, escaped)) + "}"
+
+
+# Function to render a snapshot in the Prometheus text exposition format
+def prometheus_text(data=None):
+    data = data or snapshot()
+    seconds = _prometheus_name("operation_seconds")
+    errors = _prometheus_name("operation_errors_total")
+    lines = [f"# HELP {seconds} Latency of app operations.", f"# TYPE {seconds} histogram"]
+    for op in data["operations"]:
+        labels = {"operation": op["operation"], **op["labels"]}
+        cumulative = 0
+        for bound, count in op["buckets"].items():
+            cumulative += count
+            lines.append(f"{seconds}_bucket{_prometheus_labels(labels, le=bound)} {cumulative}")
+        lines.append(f"{seconds}_sum{_prometheus_labels(labels)} {op['sum']!r}")
+        lines.append(f"{seconds}_count{_prometheus_labels(labels)} {op['count']}")
+    lines += [f"# HELP {errors} Failed app operations by exception type.", f"# TYPE {errors} counter"]
+    for op in data["operations"]:
+        for error_type, count in op["error_types"].items():
+            labels = {"operation": op["operation"], **op["labels"], "error": error_type}
+            lines.append(f"{errors}{_prometheus_labels(labels)} {count}")
+
+    declared = set()
+    for metric in data["counters"] + data["gauges"]:
+        name = _prometheus_name(metric["name"])
+        if name not in declared:
+            # Collected counts are counters too when named like one
+            lines.append(f"# TYPE {name} {'counter' if name.endswith('_total') else 'gauge'}")
+            declared.add(name)
+        lines.append(f"{name}{_prometheus_labels(metric['labels'])} {metric['value']}")
+    return "\n".join(lines) + "\n"
+
+
+# Function to export the metrics to path: appends a snapshot to *.jsonl files,
+# replaces any other file with the Prometheus text format
+def export(path):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    data = snapshot()
+    if path.endswith(".jsonl"):
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(data, ensure_ascii=False) + "\n")
+        return
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(prometheus_text(data))
+    os.replace(tmp_path, path)
+
+
+_exporter = None
+_exporter_lock = threading.Lock()
+
+
+def _export_loop(path, interval):
+    while True:
+        time.sleep(interval)
+        try:
+            export(path)
+        except OSError:
+            continue
+
+
+# Function to start exporting to path every interval seconds (once per process;
+# does nothing without a path or METRICS_EXPORT_PATH)
+def start_exporter(path=None, interval=None):
+    global _exporter
+    path = path or EXPORT_PATH
+    if not path:
+        return
+    with _exporter_lock:
+        if _exporter is None:
+            _exporter = threading.Thread(target=_export_loop, args=(path, interval or EXPORT_SECONDS),
+                                         name="metrics-export", daemon=True)
+            _exporter.start()
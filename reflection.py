@@ -0,0 +1,142 @@
+import os
+import json
+import threading
+from datetime import date
+from agents import REFLECTION_AGENT, CONDENSE_AGENT
+from journal_store import DEFAULT_USER, parse_timestamp, write_json
+
+# Rolling self-reflection.
+#
+# Instead of sending every summary ever written, the reflection is refreshed
+# from its previous text plus only the summaries past its watermark (the number
+# of summaries already folded in; the summary store is append-only).
+# Older material is kept as condensed digests:
+#   daily   - raw summary lines of the days in the newest summary's week
+#   weekly  - one digest per earlier week of the newest summary's month
+#   monthly - one digest per earlier month (the last MAX_MONTHS are kept)
+# New summaries are filed into these first and finished weeks and months are
+# condensed before the reflection is asked for, so its prompt only ever holds
+# the digests plus the current week's summaries, even on a first refresh of a
+# long journal or after a large backfill. Condensing a finished week or month
+# is one model call, so the prompt size and the cost per new session stay
+# roughly constant as the journal grows.
+
+STATE_PATH = "reflection_state.json"
+MAX_MONTHS = 12
+
+# One lock per state file, so refreshes of different users run in parallel
+_locks = {}
+_locks_lock = threading.Lock()
+
+
+def _lock_for(path):
+    with _locks_lock:
+        return _locks.setdefault(os.path.abspath(path), threading.Lock())
+
+
+def _timestamp(summary_entry):
+    return parse_timestamp(summary_entry["timestamp"]).replace(tzinfo=None)
+
+
+def _empty_state():
+    return {"watermark": 0, "latest_day": None, "reflection": None,
+            "daily": {}, "weekly": {}, "monthly": {}}
+
+
+# Function to load the persisted reflection state
+def load_state(path=STATE_PATH):
+    if not os.path.exists(path):
+        return _empty_state()
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _week_key(day):
+    year, week, _ = day.isocalendar()
+    return f"{year}-W{week:02d}"
+
+
+def _week_month(week_key):
+    year, week = week_key.split("-W")
+    return date.fromisocalendar(int(year), int(week), 1).strftime("%Y-%m")
+
+
+# Function to roll finished days into weeks and finished weeks into months
+def condense(state, today):
+    current_week = _week_key(today)
+    current_month = today.strftime("%Y-%m")
+
+    finished_days = {}
+    for day_key in list(state["daily"]):
+        week = _week_key(date.fromisoformat(day_key))
+        if week != current_week:
+            finished_days.setdefault(week, []).append(day_key)
+    for week, day_keys in sorted(finished_days.items()):
+        lines = [state["weekly"][week]] if week in state["weekly"] else []
+        for day_key in sorted(day_keys):
+            lines.extend(state["daily"].pop(day_key))
+        state["weekly"][week] = CONDENSE_AGENT.generate("\n\n".join(lines)).strip()
+
+    finished_weeks = {}
+    for week in list(state["weekly"]):
+        month = _week_month(week)
+        if month != current_month:
+            finished_weeks.setdefault(month, []).append(week)
+    for month, weeks in sorted(finished_weeks.items()):
+        parts = [state["monthly"][month]] if month in state["monthly"] else []
+        parts.extend(f"Week {week}: {state['weekly'].pop(week)}" for week in sorted(weeks))
+        state["monthly"][month] = CONDENSE_AGENT.generate("\n\n".join(parts)).strip()
+
+    # Older months live on only through the previous reflection
+    for month in sorted(state["monthly"])[:-MAX_MONTHS]:
+        del state["monthly"][month]
+
+
+# Function to build the reflection prompt from the condensed state: the digests
+# plus the summary lines of the current week
+def build_prompt(state):
+    sections = []
+    if state["reflection"]:
+        sections.append(f"My previous reflection:\n{state['reflection']}")
+    history = (
+        [f"{month}: {text}" for month, text in sorted(state["monthly"].items())]
+        + [f"{week}: {text}" for week, text in sorted(state["weekly"].items())]
+    )
+    if history:
+        sections.append("How my journal has gone so far:\n\n" + "\n\n".join(history))
+    recent = [line for day_key in sorted(state["daily"]) for line in state["daily"][day_key]]
+    if recent:
+        sections.append("Here are my recent journal entries:\n\n" + "\n\n".join(recent))
+    return "\n\n".join(sections)
+
+
+# Function to fold summaries past the watermark into the reflection.
+# Returns the reflection text; no model call is made when nothing is new.
+def refresh(summaries, on_text=None, path=STATE_PATH, user_id=DEFAULT_USER):
+    with _lock_for(path):
+        state = load_state(path)
+        new = [s for s in summaries[state["watermark"]:] if s.get("summary")]
+        if not new:
+            if on_text and state["reflection"]:
+                on_text(state["reflection"])
+            return state["reflection"]
+
+        new.sort(key=_timestamp)
+        for s in new:
+            day_key = _timestamp(s).date().isoformat()
+            state["daily"].setdefault(day_key, []).append(f"{s['timestamp']}: {s['summary']}")
+
+        # Backfilled summaries can be older than what was already folded in
+        latest_day = _timestamp(new[-1]).date()
+        if state["latest_day"]:
+            latest_day = max(latest_day, date.fromisoformat(state["latest_day"]))
+        # Condense before asking for the reflection, so its prompt stays bounded
+        condense(state, latest_day)
+
+        reflection = REFLECTION_AGENT.generate(build_prompt(state), on_text=on_text, user_id=user_id).strip()
+
+        state["reflection"] = reflection
+        state["latest_day"] = latest_day.isoformat()
+        state["watermark"] = len(summaries)
+        write_json(path, state)
+        return reflection
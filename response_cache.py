@@ -0,0 +1,84 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+# Persistent cache of model responses, keyed by a hash of everything that
+# determines the answer: agent, prompt template version, model config and the
+# full input. New summaries change the input, so they change the key.
+# Every user has their own cache directory (user_path(user_id, CACHE_DIR)), so
+# lookups and LRU eviction never touch another user's responses.
+
+CACHE_DIR = "response_cache"
+MAX_ENTRIES = 500
+
+_lock = threading.Lock()
+
+
+# Function to build the cache key for a request
+def make_key(agent_name, version, model_config, system_instruction, prompt):
+    payload = json.dumps(
+        [agent_name, version, model_config, system_instruction, prompt],
+        sort_keys=True, ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _path(key, cache_dir):
+    return os.path.join(cache_dir, key + ".json")
+
+
+# Function to get a cached response, or None if missing or older than ttl seconds
+def get(key, ttl, cache_dir=CACHE_DIR):
+    path = _path(key, cache_dir)
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            entry = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+    if ttl is not None and time.time() - entry["created"] > ttl:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        return None
+
+    # The file's mtime records the last use, for LRU eviction
+    os.utime(path)
+    return entry["text"]
+
+
+# Function to store a response and evict the least recently used entries
+def put(key, agent_name, text, cache_dir=CACHE_DIR, max_entries=MAX_ENTRIES):
+    os.makedirs(cache_dir, exist_ok=True)
+    path = _path(key, cache_dir)
+    # Unique per thread: identical requests may finish at the same time
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"created": time.time(), "agent": agent_name, "text": text}, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+    evict(cache_dir, max_entries)
+
+
+# Function to delete the least recently used entries beyond max_entries
+def evict(cache_dir=CACHE_DIR, max_entries=MAX_ENTRIES):
+    with _lock:
+        entries = []
+        for name in os.listdir(cache_dir):
+            if not name.endswith(".json"):
+                continue
+            path = os.path.join(cache_dir, name)
+            try:
+                entries.append((os.path.getmtime(path), path))
+            except FileNotFoundError:
+                continue
+        if len(entries) <= max_entries:
+            return
+        entries.sort()
+        for _, path in entries[:len(entries) - max_entries]:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
@@ -0,0 +1,178 @@
+import os
+import random
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+import metrics
+from llm import BackendError
+
+# Shared scheduler for model requests.
+#
+# Every agent call goes through one process-wide scheduler, so all sessions of
+# the app share its limits:
+#   - a token bucket caps the request rate (REQUESTS_PER_MINUTE, with bursts)
+#   - retriable errors are retried with full-jitter exponential backoff
+#   - each call has a deadline; waiting, backoff and the request itself must
+#     finish within it
+#   - identical requests already in flight are coalesced: only the first one
+#     calls the model and the others wait for its result; if the first one is
+#     interrupted (e.g. a Streamlit rerun stopping its script), a waiting one
+#     makes the request instead
+
+REQUESTS_PER_MINUTE = float(os.environ.get("LLM_REQUESTS_PER_MINUTE", 60))
+BURST = int(os.environ.get("LLM_BURST", 10))
+MAX_ATTEMPTS = 4
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 30.0
+DEFAULT_TIMEOUT = 120.0
+
+
+# Raised when a call cannot finish before its deadline
+class DeadlineExceeded(BackendError):
+    def __init__(self, message="deadline exceeded"):
+        super().__init__(message, retriable=False)
+
+
+# Set on a coalesced result whose leader was interrupted; its followers try again
+class _LeaderInterrupted(Exception):
+    pass
+
+
+# Token bucket: rate tokens per second, holding at most burst tokens
+class TokenBucket:
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    # Take a token, waiting for one until the deadline (a time.monotonic() value)
+    def acquire(self, deadline=None):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            if deadline is not None and now + wait > deadline:
+                raise DeadlineExceeded("deadline exceeded waiting for the rate limit")
+            time.sleep(wait)
+
+
+class Scheduler:
+    def __init__(self, requests_per_minute=REQUESTS_PER_MINUTE, burst=BURST,
+                 max_attempts=MAX_ATTEMPTS, backoff_base=BACKOFF_BASE, backoff_max=BACKOFF_MAX):
+        self.bucket = TokenBucket(requests_per_minute / 60.0, burst) if requests_per_minute else None
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._in_flight = {}
+        self._lock = threading.Lock()
+        # Counts of coalesced calls and retries, for diagnostics
+        self.coalesced = 0
+        self.retries = 0
+
+    # Run request(timeout) with rate limiting and retries; calls with the same
+    # key made while it runs get its result instead of calling the model again.
+    # on_result(text) is called for followers once the shared result is ready.
+    def call(self, key, request, timeout=DEFAULT_TIMEOUT, on_result=None):
+        deadline = time.monotonic() + timeout if timeout else None
+        while True:
+            with self._lock:
+                future = self._in_flight.get(key) if key else None
+                leader = future is None
+                if leader:
+                    future = Future()
+                    if key:
+                        self._in_flight[key] = future
+                else:
+                    self.coalesced += 1
+            if leader:
+                break
+
+            remaining = deadline - time.monotonic() if deadline else None
+            try:
+                text = future.result(timeout=remaining)
+            except FutureTimeout:
+                raise DeadlineExceeded("deadline exceeded waiting for an identical request")
+            except _LeaderInterrupted:
+                continue
+            if on_result:
+                on_result(text)
+            return text
+
+        try:
+            text = self._run(request, deadline)
+        except BaseException as e:
+            # Removed first, so a follower that wakes up starts a new request
+            self._release(key)
+            # Only errors are shared: an interruption (a BaseException) is the leader's own
+            future.set_exception(e if isinstance(e, Exception) else _LeaderInterrupted())
+            raise
+        self._release(key)
+        future.set_result(text)
+        return text
+
+    def _release(self, key):
+        if key:
+            with self._lock:
+                self._in_flight.pop(key, None)
+
+    def _run(self, request, deadline):
+        attempt = 0
+        while True:
+            if self.bucket:
+                self.bucket.acquire(deadline)
+            remaining = deadline - time.monotonic() if deadline else None
+            if remaining is not None and remaining <= 0:
+                raise DeadlineExceeded()
+            try:
+                return request(remaining)
+            except BackendError as e:
+                attempt += 1
+                if not e.retriable or attempt >= self.max_attempts:
+                    raise
+                delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** (attempt - 1)))
+                if deadline and time.monotonic() + delay > deadline:
+                    raise DeadlineExceeded(f"deadline exceeded retrying: {e}") from e
+                with self._lock:
+                    self.retries += 1
+                time.sleep(delay)
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+# Function to get the process-wide scheduler
+def get_scheduler():
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = Scheduler()
+        return _scheduler
+
+
+# Function to replace the process-wide scheduler (e.g. with other limits)
+def set_scheduler(scheduler):
+    global _scheduler
+    with _scheduler_lock:
+        _scheduler = scheduler
+
+
+def _counts():
+    scheduler = _scheduler
+    if scheduler is None:
+        return []
+    with scheduler._lock:
+        in_flight = len(scheduler._in_flight)
+    return [("scheduler_coalesced_total", {}, scheduler.coalesced),
+            ("scheduler_retries_total", {}, scheduler.retries),
+            ("scheduler_in_flight", {}, in_flight)]
+
+
+metrics.register_collector(_counts)
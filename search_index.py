@@ -0,0 +1,146 @@
+import re
+import sqlite3
+import threading
+
+# Full-text search over a user's journal.
+#
+# An SQLite FTS5 table (Porter stemming, BM25 ranking) holds one document per
+# entry (its text, with the mentor's reply in a second, lower-weighted column)
+# and one per summary. Sessions and summaries are append-only, so
+# the index only remembers how many of each it has seen (its watermarks) and
+# every sync indexes just the records past them, in one transaction (or in
+# batches of limit records, so a first build does not hold the index for long).
+
+SEARCH_DB = "search.db"
+MAX_RESULTS = 20
+# BM25 weight of a match in the text and in the mentor's reply
+TEXT_WEIGHT = 1.0
+REPLY_WEIGHT = 0.4
+
+# Document kinds
+ENTRY = "entry"
+SUMMARY = "summary"
+
+# Words too common to narrow a search (ranking them means scoring most of the journal)
+STOPWORDS = {"a", "an", "and", "are", "as", "at", "be", "but", "by", "for", "i", "in", "is", "it", "me",
+             "my", "of", "on", "or", "so", "that", "the", "to", "was", "we", "with", "you"}
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+# Function to turn free text into an FTS5 query: every word must match, the last one
+# (if long enough) as a prefix; stopwords are dropped unless there is nothing else
+def match_query(text):
+    words = _TOKEN_RE.findall(text.lower())
+    words = [word for word in words if word not in STOPWORDS] or words
+    if not words:
+        return None
+    terms = [f'"{word}"' for word in words]
+    if len(words[-1]) >= 2:
+        terms[-1] += "*"
+    return " ".join(terms)
+
+
+class SearchIndex:
+    SCHEMA = """
+    CREATE VIRTUAL TABLE IF NOT EXISTS docs USING fts5(
+        text,
+        reply,
+        kind UNINDEXED,
+        session_timestamp UNINDEXED,
+        timestamp UNINDEXED,
+        tokenize = 'porter unicode61',
+        prefix = '2 3'
+    );
+    CREATE TABLE IF NOT EXISTS watermarks (
+        kind TEXT PRIMARY KEY,
+        count INTEGER NOT NULL
+    );
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(self.SCHEMA)
+
+    def _watermark(self, kind):
+        row = self.conn.execute("SELECT count FROM watermarks WHERE kind = ?", (kind,)).fetchone()
+        return row[0] if row else 0
+
+    # Function to count the sessions and summaries not indexed yet (all of them
+    # if the journal was replaced)
+    def behind(self, session_count, summary_count):
+        with self._lock:
+            session_mark = self._watermark("sessions")
+            summary_mark = self._watermark("summaries")
+        if session_mark > session_count or summary_mark > summary_count:
+            return session_count + summary_count
+        return session_count - session_mark + summary_count - summary_mark
+
+    # Index the sessions and summaries past the watermarks, at most limit records
+    # (sessions first); returns the number of new documents
+    def sync(self, sessions, summaries, limit=None):
+        with self._lock, self.conn:
+            # Other processes may sync the same file; take the write lock before reading the watermarks
+            self.conn.execute("BEGIN IMMEDIATE")
+            session_mark = self._watermark("sessions")
+            summary_mark = self._watermark("summaries")
+            # Fewer records than already indexed: the journal was replaced, start over
+            if session_mark > len(sessions) or summary_mark > len(summaries):
+                self.conn.execute("DELETE FROM docs")
+                session_mark = summary_mark = 0
+            if session_mark == len(sessions) and summary_mark == len(summaries):
+                return 0
+
+            new_sessions = sessions[session_mark:]
+            new_summaries = summaries[summary_mark:]
+            if limit is not None:
+                new_sessions = new_sessions[:limit]
+                new_summaries = new_summaries[:limit - len(new_sessions)]
+            docs = []
+            for session in new_sessions:
+                for entry in session.get("entries", []):
+                    if entry.get("user_input") or entry.get("mentor_response"):
+                        docs.append((entry.get("user_input") or "", entry.get("mentor_response") or "", ENTRY,
+                                     session["session_timestamp"], entry.get("timestamp")))
+            for summary_entry in new_summaries:
+                if summary_entry.get("summary"):
+                    docs.append((summary_entry["summary"], "", SUMMARY, summary_entry.get("session_timestamp"),
+                                 summary_entry["timestamp"]))
+            self.conn.executemany(
+                "INSERT INTO docs (text, reply, kind, session_timestamp, timestamp) VALUES (?, ?, ?, ?, ?)", docs)
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO watermarks (kind, count) VALUES (?, ?)",
+                [("sessions", session_mark + len(new_sessions)), ("summaries", summary_mark + len(new_summaries))])
+            return len(docs)
+
+    # Function to find the best matches for free text, best first
+    def search(self, text, limit=MAX_RESULTS, kinds=None):
+        query = match_query(text)
+        if query is None:
+            return []
+        # Column -1: the snippet comes from whichever column matched best
+        sql = ("SELECT kind, session_timestamp, timestamp, snippet(docs, -1, '**', '**', '…', 16), "
+               "bm25(docs, ?, ?) AS score FROM docs WHERE docs MATCH ?")
+        params = [TEXT_WEIGHT, REPLY_WEIGHT, query]
+        if kinds:
+            sql += f" AND kind IN ({', '.join('?' * len(kinds))})"
+            params.extend(kinds)
+        sql += " ORDER BY score LIMIT ?"
+        params.append(limit)
+        with self._lock:
+            rows = self.conn.execute(sql, params).fetchall()
+        return [
+            {"kind": kind, "session_timestamp": session_timestamp, "timestamp": timestamp,
+             "snippet": snippet, "score": -score}
+            for kind, session_timestamp, timestamp, snippet, score in rows
+        ]
+
+    def document_count(self):
+        with self._lock:
+            return self.conn.execute("SELECT count(*) FROM docs").fetchone()[0]
+
+    def close(self):
+        self.conn.close()
@@ -0,0 +1,130 @@
+import re
+import numpy as np
+
+# Offline sentiment and emotion scoring of journal entries.
+#
+# A small built-in lexicon gives every known word a valence (-1..1) and
+# optionally one emotion. Texts are tokenized once into (row, word, weight)
+# triples, handling negation ("not happy") and intensifiers ("very tired"),
+# and all scores come from a couple of NumPy reductions over them, so a whole
+# journal is scored in milliseconds without any model call:
+#   valence   - summed word valence squashed into -1..1 (0 when nothing matched)
+#   emotions  - share of emotion words per emotion (rows sum to 1 or 0)
+
+EMOTIONS = ("joy", "sadness", "anger", "fear", "calm")
+
+# word: (valence, emotion or None)
+LEXICON = {
+    # joy
+    "happy": (0.8, "joy"), "happiness": (0.8, "joy"), "joy": (0.9, "joy"), "joyful": (0.9, "joy"),
+    "glad": (0.6, "joy"), "excited": (0.7, "joy"), "exciting": (0.6, "joy"), "fun": (0.6, "joy"),
+    "great": (0.6, "joy"), "good": (0.4, "joy"), "wonderful": (0.9, "joy"), "amazing": (0.8, "joy"),
+    "awesome": (0.8, "joy"), "love": (0.8, "joy"), "loved": (0.8, "joy"), "lovely": (0.7, "joy"),
+    "proud": (0.7, "joy"), "delighted": (0.8, "joy"), "cheerful": (0.7, "joy"), "fantastic": (0.9, "joy"),
+    "enjoy": (0.6, "joy"), "enjoyed": (0.6, "joy"), "laugh": (0.6, "joy"), "laughed": (0.6, "joy"),
+    "smile": (0.5, "joy"), "smiled": (0.5, "joy"), "thankful": (0.7, "joy"), "grateful": (0.8, "joy"),
+    "gratitude": (0.7, "joy"), "hopeful": (0.6, "joy"), "hope": (0.4, "joy"), "success": (0.6, "joy"),
+    "accomplished": (0.7, "joy"), "win": (0.6, "joy"), "productive": (0.5, "joy"), "motivated": (0.6, "joy"),
+    "energized": (0.6, "joy"), "inspired": (0.7, "joy"), "beautiful": (0.7, "joy"), "nice": (0.4, "joy"),
+    "better": (0.4, "joy"), "best": (0.6, "joy"), "confident": (0.6, "joy"),
+    # sadness
+    "sad": (-0.7, "sadness"), "sadness": (-0.7, "sadness"), "unhappy": (-0.7, "sadness"),
+    "depressed": (-0.9, "sadness"), "down": (-0.4, "sadness"), "lonely": (-0.7, "sadness"),
+    "alone": (-0.4, "sadness"), "cry": (-0.6, "sadness"), "cried": (-0.6, "sadness"), "crying": (-0.6, "sadness"),
+    "miss": (-0.4, "sadness"), "missed": (-0.3, "sadness"), "hurt": (-0.6, "sadness"), "grief": (-0.8, "sadness"),
+    "loss": (-0.6, "sadness"), "lost": (-0.5, "sadness"), "tired": (-0.4, "sadness"), "exhausted": (-0.6, "sadness"),
+    "drained": (-0.6, "sadness"), "empty": (-0.6, "sadness"), "hopeless": (-0.9, "sadness"),
+    "disappointed": (-0.6, "sadness"), "regret": (-0.6, "sadness"), "bored": (-0.3, "sadness"),
+    "heartbroken": (-0.9, "sadness"), "miserable": (-0.9, "sadness"), "bad": (-0.5, "sadness"),
+    "worse": (-0.5, "sadness"), "worst": (-0.7, "sadness"), "low": (-0.3, "sadness"), "fail": (-0.6, "sadness"),
+    "failed": (-0.6, "sadness"), "failure": (-0.7, "sadness"), "sick": (-0.5, "sadness"),
+    # anger
+    "angry": (-0.7, "anger"), "anger": (-0.7, "anger"), "mad": (-0.6, "anger"), "furious": (-0.9, "anger"),
+    "annoyed": (-0.5, "anger"), "annoying": (-0.5, "anger"), "irritated": (-0.5, "anger"),
+    "frustrated": (-0.6, "anger"), "frustrating": (-0.6, "anger"), "frustration": (-0.6, "anger"),
+    "hate": (-0.8, "anger"), "hated": (-0.8, "anger"), "resent": (-0.6, "anger"), "unfair": (-0.5, "anger"),
+    "rage": (-0.9, "anger"), "upset": (-0.6, "anger"), "argument": (-0.5, "anger"), "fight": (-0.5, "anger"),
+    "yelled": (-0.6, "anger"), "bitter": (-0.6, "anger"),
+    # fear
+    "anxious": (-0.6, "fear"), "anxiety": (-0.7, "fear"), "worried": (-0.6, "fear"), "worry": (-0.5, "fear"),
+    "afraid": (-0.7, "fear"), "scared": (-0.7, "fear"), "fear": (-0.7, "fear"), "nervous": (-0.5, "fear"),
+    "stressed": (-0.6, "fear"), "stress": (-0.5, "fear"), "stressful": (-0.6, "fear"), "panic": (-0.8, "fear"),
+    "overwhelmed": (-0.7, "fear"), "overwhelming": (-0.6, "fear"), "pressure": (-0.4, "fear"),
+    "uncertain": (-0.4, "fear"), "insecure": (-0.6, "fear"), "terrified": (-0.9, "fear"), "dread": (-0.7, "fear"),
+    "deadline": (-0.2, "fear"), "confused": (-0.4, "fear"),
+    # calm
+    "calm": (0.6, "calm"), "peaceful": (0.7, "calm"), "peace": (0.6, "calm"), "relaxed": (0.6, "calm"),
+    "relaxing": (0.6, "calm"), "rested": (0.5, "calm"), "content": (0.6, "calm"), "safe": (0.5, "calm"),
+    "relieved": (0.6, "calm"), "relief": (0.5, "calm"), "comfortable": (0.5, "calm"), "quiet": (0.3, "calm"),
+    "balanced": (0.5, "calm"), "mindful": (0.5, "calm"), "meditated": (0.5, "calm"), "gentle": (0.4, "calm"),
+    "okay": (0.2, "calm"), "fine": (0.2, "calm"), "steady": (0.4, "calm"),
+    # valence only
+    "long": (-0.1, None), "hard": (-0.3, None), "difficult": (-0.4, None), "problem": (-0.4, None),
+    "struggle": (-0.5, None), "struggled": (-0.5, None), "struggling": (-0.5, None), "pain": (-0.6, None),
+    "easy": (0.3, None), "kind": (0.4, None), "helpful": (0.4, None), "support": (0.4, None),
+    "progress": (0.4, None), "growth": (0.4, None), "friends": (0.3, None), "family": (0.2, None),
+}
+
+NEGATIONS = {"not", "no", "never", "nothing", "nobody", "hardly", "without", "cannot"}
+NEGATION_WINDOW = 3
+INTENSIFIERS = {"very": 1.5, "really": 1.4, "so": 1.3, "extremely": 1.8, "super": 1.5,
+                "totally": 1.4, "slightly": 0.6, "somewhat": 0.7, "bit": 0.7, "little": 0.8}
+# Larger values squash summed valence less
+NORMALIZE_ALPHA = 4.0
+
+_WORD_RE = re.compile(r"[a-z']+")
+_VOCAB = {word: i for i, word in enumerate(LEXICON)}
+_VALENCE = np.array([valence for valence, _ in LEXICON.values()], dtype=np.float32)
+_EMOTION = np.zeros((len(LEXICON), len(EMOTIONS)), dtype=np.float32)
+for _i, (_, _emotion) in enumerate(LEXICON.values()):
+    if _emotion:
+        _EMOTION[_i, EMOTIONS.index(_emotion)] = 1.0
+
+
+# Function to find a word in the lexicon, trying common inflections
+def _lookup(word):
+    index = _VOCAB.get(word)
+    if index is None:
+        for suffix in ("s", "ed", "ing", "ly"):
+            if word.endswith(suffix) and word[:-len(suffix)] in _VOCAB:
+                return _VOCAB[word[:-len(suffix)]]
+    return index
+
+
+# Function to turn texts into parallel arrays of (text row, lexicon index, weight)
+def _tokens(texts):
+    rows, ids, weights = [], [], []
+    for row, text in enumerate(texts):
+        negate = 0
+        boost = 1.0
+        for word in _WORD_RE.findall(text.lower()):
+            if word in NEGATIONS or word.endswith("n't"):
+                negate = NEGATION_WINDOW
+                continue
+            if word in INTENSIFIERS:
+                boost = INTENSIFIERS[word]
+                continue
+            index = _lookup(word)
+            if index is not None:
+                rows.append(row)
+                ids.append(index)
+                weights.append(-boost if negate else boost)
+            boost = 1.0
+            negate = max(negate - 1, 0)
+    return (np.array(rows, dtype=np.int64), np.array(ids, dtype=np.int64),
+            np.array(weights, dtype=np.float32))
+
+
+# Function to score texts, returning (valence per text, emotion shares per text and EMOTIONS)
+def score_texts(texts):
+    n = len(texts)
+    rows, ids, weights = _tokens(texts)
+    total = np.bincount(rows, weights=_VALENCE[ids] * weights, minlength=n).astype(np.float32)
+    valence = total / np.sqrt(total * total + NORMALIZE_ALPHA)
+
+    # Negated emotion words ("not happy") say little about which emotion it was
+    emotions = np.zeros((n, len(EMOTIONS)), dtype=np.float32)
+    np.add.at(emotions, rows, _EMOTION[ids] * (weights > 0)[:, None])
+    counts = emotions.sum(axis=1, keepdims=True)
+    np.divide(emotions, counts, out=emotions, where=counts > 0)
+    return valence, emotions
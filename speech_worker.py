@@ -0,0 +1,207 @@
+import os
+import queue
+import threading
+import time
+import uuid
+import metrics
+import transcription
+
+# Speech input captured and transcribed off the Streamlit script thread.
+#
+# A recording runs two background threads joined by a chunk queue:
+#   - capture reads phrases from an audio source (microphone or WAV file) and
+#     puts them on the queue until it is stopped, runs out or MAX_SECONDS pass
+#   - transcription feeds the chunks to a stream of the speech backend (see
+#     transcription) and updates the recording's state as text comes back
+# The page only polls the state (status, partial transcripts, error), so it
+# stays responsive and Stop takes effect within LISTEN_TIMEOUT seconds.
+# Opening a stream (which loads an offline model on first use) and every chunk
+# are timed in metrics, with the seconds of audio transcribed per backend.
+#
+# SPEECH_SOURCE_FILE=<path.wav> replaces the microphone with a file, so speech
+# input can be tried without one.
+
+MAX_SECONDS = 30
+LISTEN_TIMEOUT = 1
+PHRASE_SECONDS = 5
+AMBIENT_SECONDS = 0.5
+SOURCE_FILE = os.environ.get("SPEECH_SOURCE_FILE")
+
+# Recording states
+LISTENING = "listening"
+TRANSCRIBING = "transcribing"
+DONE = "done"
+FAILED = "failed"
+
+_lock = threading.Lock()
+_recordings = {}
+
+
+# Audio from the default microphone, one phrase per chunk
+class MicrophoneSource:
+    def __init__(self, phrase_seconds=PHRASE_SECONDS):
+        self.phrase_seconds = phrase_seconds
+
+    def chunks(self, stop):
+        # Deferred: only needed when speech input is used
+        import speech_recognition as sr
+
+        recognizer = sr.Recognizer()
+        with sr.Microphone() as source:
+            recognizer.adjust_for_ambient_noise(source, duration=AMBIENT_SECONDS)
+            while not stop.is_set():
+                try:
+                    # Short timeout so a stop is noticed between phrases
+                    yield recognizer.listen(source, timeout=LISTEN_TIMEOUT, phrase_time_limit=self.phrase_seconds)
+                except sr.WaitTimeoutError:
+                    continue
+
+
+# Audio from a WAV/AIFF/FLAC file, in fixed-length chunks; realtime=True
+# paces the chunks like a live microphone would
+class FileSource:
+    def __init__(self, path, chunk_seconds=PHRASE_SECONDS, realtime=False):
+        self.path = path
+        self.chunk_seconds = chunk_seconds
+        self.realtime = realtime
+
+    def chunks(self, stop):
+        import speech_recognition as sr
+
+        with sr.AudioFile(self.path) as source:
+            frames = int(self.chunk_seconds * source.SAMPLE_RATE)
+            while not stop.is_set():
+                data = source.stream.read(frames)
+                if not data:
+                    break
+                if self.realtime:
+                    stop.wait(len(data) / (source.SAMPLE_RATE * source.SAMPLE_WIDTH))
+                yield sr.AudioData(data, source.SAMPLE_RATE, source.SAMPLE_WIDTH)
+
+
+# Function to get the audio source speech input records from
+def default_source():
+    return FileSource(SOURCE_FILE, realtime=True) if SOURCE_FILE else MicrophoneSource()
+
+
+# State of one recording, shared between its threads and the page polling it
+class Recording:
+    def __init__(self, recording_id):
+        self.recording_id = recording_id
+        self.status = LISTENING
+        self.partials = []
+        # Guess at the words still being recognized, replaced as more audio arrives
+        self.pending = ""
+        self.error = None
+        self.started = time.monotonic()
+        self.stop_event = threading.Event()
+        self.chunks = queue.Queue()
+
+    def text(self):
+        return " ".join(self.partials + ([self.pending] if self.pending else []))
+
+    def active(self):
+        return self.status in (LISTENING, TRANSCRIBING)
+
+    def stop(self):
+        self.stop_event.set()
+
+
+# Marks the end of the chunk queue
+_END = object()
+
+
+def _update(recording, final, partial):
+    # New lists are swapped in at once, so the page never sees half an update
+    if final.strip():
+        recording.partials = recording.partials + [final.strip()]
+    recording.pending = partial.strip()
+
+
+def _capture(recording, source, max_seconds):
+    # Stop at the time limit even when the source yields nothing (silence)
+    timer = threading.Timer(max(0, recording.started + max_seconds - time.monotonic()), recording.stop)
+    timer.daemon = True
+    timer.start()
+    try:
+        for chunk in source.chunks(recording.stop_event):
+            recording.chunks.put(chunk)
+    except Exception as e:
+        recording.error = f"Couldn't record audio: {e}"
+    finally:
+        timer.cancel()
+        if recording.status == LISTENING:
+            recording.status = TRANSCRIBING
+        recording.chunks.put(_END)
+
+
+def _transcribe(recording, backend):
+    try:
+        with metrics.timed("speech.open", backend=backend.name):
+            stream = backend.stream()
+    except Exception as e:
+        stream = None
+        recording.error = f"Couldn't start transcription: {e}"
+        recording.stop()
+    while True:
+        chunk = recording.chunks.get()
+        if chunk is _END:
+            break
+        if stream is None:
+            continue
+        try:
+            with metrics.timed("speech.chunk", backend=backend.name):
+                final, partial = stream.accept(chunk)
+            metrics.increment("speech_audio_seconds_total",
+                              len(chunk.frame_data) / (chunk.sample_rate * chunk.sample_width), backend=backend.name)
+        except Exception as e:
+            # Keep what was transcribed so far; the rest of the audio is dropped
+            stream = None
+            recording.error = str(e)
+            recording.stop()
+            continue
+        _update(recording, final, partial)
+    if stream is not None:
+        try:
+            with metrics.timed("speech.finish", backend=backend.name):
+                _update(recording, stream.finish(), "")
+        except Exception as e:
+            recording.error = str(e)
+    recording.pending = ""
+    if recording.error and not recording.partials:
+        recording.status = FAILED
+    else:
+        recording.status = DONE
+
+
+# Function to start recording in the background, returning the recording id
+def start(source=None, backend=None, max_seconds=MAX_SECONDS):
+    recording = Recording(uuid.uuid4().hex)
+    with _lock:
+        _recordings[recording.recording_id] = recording
+    source = source or default_source()
+    backend = backend or transcription.get_backend()
+    threading.Thread(target=_capture, args=(recording, source, max_seconds),
+                     name="speech-capture", daemon=True).start()
+    threading.Thread(target=_transcribe, args=(recording, backend),
+                     name="speech-transcribe", daemon=True).start()
+    return recording.recording_id
+
+
+# Function to get a recording's state, or None if it is unknown
+def get(recording_id):
+    with _lock:
+        return _recordings.get(recording_id)
+
+
+# Function to stop capturing; chunks already captured are still transcribed
+def stop(recording_id):
+    recording = get(recording_id)
+    if recording:
+        recording.stop()
+
+
+# Function to forget a finished recording
+def discard(recording_id):
+    with _lock:
+        _recordings.pop(recording_id, None)
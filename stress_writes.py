@@ -0,0 +1,123 @@
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+# Stress test for concurrent journal writes.
+#
+# Several processes, each with several threads, append sessions and summaries
+# to the same user's store at the same time (like many tabs ending sessions
+# together). Afterwards every record written must be readable exactly once.
+#
+# Usage:
+#   python stress_writes.py                        # every backend
+#   python stress_writes.py --backend json --processes 8 --threads 8 --writes 50
+
+BACKENDS = ["json", "jsonl", "sqlite"]
+USER = "stress"
+
+
+# Worker: runs inside one writer process
+def run_worker(data_dir, backend, worker, threads, writes):
+    os.chdir(data_dir)
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from journal_store import open_store
+
+    store = open_store(backend, user_id=USER)
+    errors = []
+
+    def write(thread):
+        for i in range(writes):
+            record_id = f"{worker}-{thread}-{i}"
+            try:
+                store.append_session({
+                    "session_timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                    "entries": [{"timestamp": "", "user_input": record_id}],
+                })
+                store.append_summary({
+                    "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                    "summary": record_id,
+                })
+            except Exception as e:
+                errors.append(f"{record_id}: {e!r}")
+
+    pool = [threading.Thread(target=write, args=(t,)) for t in range(threads)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    for error in errors:
+        print(error, file=sys.stderr)
+    sys.exit(1 if errors else 0)
+
+
+# Function to run one backend and check that no write was lost or duplicated
+def stress(backend, processes, threads, writes):
+    from journal_store import open_store
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        start = time.perf_counter()
+        workers = [
+            subprocess.Popen(
+                [sys.executable, os.path.abspath(__file__), "--worker", data_dir, "--backend", backend,
+                 "--worker-id", str(w), "--threads", str(threads), "--writes", str(writes)],
+                stderr=subprocess.PIPE, text=True,
+            )
+            for w in range(processes)
+        ]
+        failures = []
+        for worker in workers:
+            _, stderr = worker.communicate()
+            if worker.returncode != 0:
+                failures.append(stderr.strip().splitlines()[-1] if stderr.strip() else "failed")
+        elapsed = time.perf_counter() - start
+
+        cwd = os.getcwd()
+        os.chdir(data_dir)
+        try:
+            store = open_store(backend, user_id=USER)
+            session_ids = [s["entries"][0]["user_input"] for s in store.load_sessions()]
+            summary_ids = [s["summary"] for s in store.load_summaries()]
+            if hasattr(store, "conn"):
+                store.conn.close()
+        finally:
+            os.chdir(cwd)
+
+    expected = {f"{w}-{t}-{i}" for w in range(processes) for t in range(threads) for i in range(writes)}
+    ok = True
+    print(f"{backend}: {processes} processes x {threads} threads x {writes} writes in {elapsed:.2f}s")
+    for kind, ids in (("sessions", session_ids), ("summaries", summary_ids)):
+        lost = len(expected - set(ids))
+        duplicated = len(ids) - len(set(ids))
+        ok = ok and not lost and not duplicated
+        print(f"  {kind}: {len(ids)}/{len(expected)} stored, {lost} lost, {duplicated} duplicated")
+    for failure in failures:
+        ok = False
+        print(f"  writer failed: {failure}")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check that concurrent journal writes lose nothing.")
+    parser.add_argument("--backend", choices=BACKENDS, action="append")
+    parser.add_argument("--processes", type=int, default=4)
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--writes", type=int, default=25, help="sessions and summaries per thread")
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    parser.add_argument("--worker-id", type=int, default=0, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args.worker, args.backend[0], args.worker_id, args.threads, args.writes)
+        return
+
+    results = [stress(backend, args.processes, args.threads, args.writes) for backend in args.backend or BACKENDS]
+    print("PASS" if all(results) else "FAIL")
+    sys.exit(0 if all(results) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,84 +1,150 @@
-
-from dotenv import load_dotenv
+import argparse
 import os
-import json
-import google.generativeai as genai
-
-# Load environment variables
-load_dotenv()
-
-# Configure Gemini API
-genai.configure(api_key=os.environ["GEMINI_API_KEY"])
-# Load Gemini model
-model = genai.GenerativeModel(
-    model_name="models/gemini-2.5-pro-exp-03-25",
-    generation_config={
-        "temperature": 1,
-        "top_p": 0.95,
-        "top_k": 64,
-        "max_output_tokens": 65536,
-        "response_mime_type": "text/plain",
-    },
-)
-
-# Load the journal entries
-with open("journal_entries.json", "r") as f:
-    journal_data = json.load(f)
-
-# Get the last session
-latest_session = journal_data[-1]
-timestamp = latest_session["session_timestamp"]
-entries = latest_session["entries"]
-
-# Combine the session into plain text
-combined_text = "\n".join(
-    f"{entry['timestamp']} - You: {entry['user_input']}" for entry in entries
-)
-
-# System prompt for summarization
-system_prompt = """
-You are a journaling assistant. Summarize the user's full journaling session.
-
-Include:
-- Important events and dates
-- The emotional tone and how it changed
-- Observations about the user's personality and emotional state
-
-Keep it short (4-6 lines). Write in a friendly, human tone.
-
-Output only the summary text. Do NOT include any JSON formatting or labels.
-"""
-
-# Generate summary using Gemini (correct method)
-# The original line caused the KeyError because the `history` parameter in `start_chat`
-# was not in the correct format for the Gemini API. This updated code creates a new chat
-# and sends the system prompt and user message as individual messages which is the 
-# appropriate way to interact with `start_chat`
-chat = model.start_chat()
-chat.send_message(system_prompt)
-response = chat.send_message(combined_text)
-
-
-# Get the summary from the response
-summary_text = response.text.strip()
-
-# Format the final flat summary
-summary_entry = {
-    "timestamp": timestamp,
-    "summary": summary_text
-}
-
-# Save to journal_summary.json
-summary_path = "journal_summary.json"
-if os.path.exists(summary_path):
-    with open(summary_path, "r") as f:
-        summaries = json.load(f)
-else:
-    summaries = []
-
-summaries.append(summary_entry)
-
-with open(summary_path, "w") as f:
-    json.dump(summaries, f, indent=2)
-
-print("✅ Summary added to journal_summary.json")
\ No newline at end of file
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from journal_store import DEFAULT_USER, open_store, parse_timestamp, append_jsonl, read_jsonl, user_path
+from agents import SUMMARY_AGENT, count_calls
+from llm import BackendError, configure, get_backend
+from scheduler import Scheduler, set_scheduler
+
+# Backfill of missing session summaries.
+#
+# Every session without a summary is summarized by a bounded pool of workers,
+# with model calls rate limited and retried by the shared scheduler. Finished summaries are checkpointed to
+# PROGRESS_LOG as they arrive, so an interrupted run resumes without repeating
+# them, and all of them are saved to the user's summaries in one batched write.
+#
+# Usage:
+#   python summary.py                      # summarize every missing session
+#   python summary.py --since 2025-04-01   # only sessions from that date on
+#   python summary.py --dry-run            # list what would be summarized
+#   python summary.py --user alice         # another user's journal
+
+PROGRESS_LOG = "summary_backfill.jsonl"
+MAX_WORKERS = 4
+REQUESTS_PER_MINUTE = 30
+
+
+# Function to find the sessions that already have a summary.
+# Summaries record their session_timestamp; older ones only have the time they
+# were written, which is matched to the latest session started at or before it.
+def summarized_sessions(sessions, summaries):
+    session_times = sorted(
+        (parse_timestamp(s["session_timestamp"]).replace(tzinfo=None), s["session_timestamp"])
+        for s in sessions
+    )
+    done = set()
+    for summary_entry in summaries:
+        if summary_entry.get("session_timestamp"):
+            done.add(summary_entry["session_timestamp"])
+            continue
+        written = parse_timestamp(summary_entry["timestamp"]).replace(tzinfo=None)
+        match = None
+        for started, session_timestamp in session_times:
+            if started > written:
+                break
+            match = session_timestamp
+        if match:
+            done.add(match)
+    return done
+
+
+# Function to find the sessions with entries that still need a summary
+def missing_sessions(sessions, summaries, since=None):
+    done = summarized_sessions(sessions, summaries)
+    missing = []
+    for session in sessions:
+        if session["session_timestamp"] in done or not session.get("entries"):
+            continue
+        if since and parse_timestamp(session["session_timestamp"]).replace(tzinfo=None) < since:
+            continue
+        missing.append(session)
+    return missing
+
+
+# Function to summarize one session into a summary entry
+def summarize_session(session):
+    combined_text = "\n".join(
+        f"{entry['timestamp']} - You: {entry['user_input']}" for entry in session["entries"]
+    )
+    summary_text = SUMMARY_AGENT.generate(combined_text).strip()
+    return {
+        "timestamp": session["session_timestamp"],
+        "summary": summary_text,
+        "session_timestamp": session["session_timestamp"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarize every journal session that has no summary yet.")
+    parser.add_argument("--user", default=DEFAULT_USER, help="whose journal to backfill")
+    parser.add_argument("--since", help="only sessions started on or after this date (ISO format)")
+    parser.add_argument("--dry-run", action="store_true", help="list the sessions without summarizing")
+    parser.add_argument("--workers", type=int, default=MAX_WORKERS)
+    parser.add_argument("--rate", type=float, default=REQUESTS_PER_MINUTE, help="model calls per minute")
+    args = parser.parse_args()
+
+    since = parse_timestamp(args.since).replace(tzinfo=None) if args.since else None
+    store = open_store(user_id=args.user)
+    progress_log = user_path(args.user, PROGRESS_LOG)
+    sessions = store.load_sessions()
+    missing = missing_sessions(sessions, store.load_summaries(), since)
+
+    # Summaries finished by an interrupted run
+    pending = {s["session_timestamp"]: s for s in read_jsonl(progress_log)}
+    results = [pending[s["session_timestamp"]] for s in missing if s["session_timestamp"] in pending]
+    todo = [s for s in missing if s["session_timestamp"] not in pending]
+
+    print(f"{len(sessions)} sessions, {len(missing)} without a summary "
+          f"({len(results)} already done by an interrupted run)")
+    if args.dry_run:
+        for session in todo:
+            print(f"  {session['session_timestamp']} ({len(session['entries'])} entries)")
+        return
+
+    # Without a Gemini API key every session would fail the same way: stop before starting
+    if get_backend().name == "gemini":
+        try:
+            configure()
+        except BackendError as e:
+            parser.exit(1, f"{e}\n")
+
+    # No bursts: calls start evenly spaced at the requested rate
+    set_scheduler(Scheduler(requests_per_minute=args.rate, burst=1))
+    failures = []
+
+    executor = ThreadPoolExecutor(max_workers=args.workers)
+    with count_calls() as calls:
+        futures = {executor.submit(summarize_session, session): session for session in todo}
+        try:
+            for future in as_completed(futures):
+                session = futures[future]
+                try:
+                    summary_entry = future.result()
+                except Exception as e:
+                    failures.append(session["session_timestamp"])
+                    print(f"  ✗ {session['session_timestamp']}: {e}")
+                    continue
+                append_jsonl(progress_log, summary_entry)
+                results.append(summary_entry)
+                print(f"  ✓ {session['session_timestamp']} ({len(results)}/{len(missing)})")
+        except KeyboardInterrupt:
+            executor.shutdown(wait=False, cancel_futures=True)
+            print(f"Interrupted: {len(results)} summaries kept in {progress_log}, run again to resume")
+            return
+        executor.shutdown()
+
+    # One batched write, in session order
+    results.sort(key=lambda s: parse_timestamp(s["session_timestamp"]).replace(tzinfo=None))
+    if results:
+        store.append_summaries(results)
+    if os.path.exists(progress_log):
+        os.remove(progress_log)
+
+    print(f"✅ {len(results)} summaries added to the journal summaries")
+    if failures:
+        print(f"⚠ {len(failures)} sessions failed, run again to retry them")
+    print(f"Model calls: {calls['summary']}")
+
+
+if __name__ == "__main__":
+    main()
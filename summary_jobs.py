@@ -0,0 +1,179 @@
+import os
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+import data_access
+from journal_store import (DEFAULT_USER, append_jsonl, file_lock, list_users, owner_alive, process_owner,
+                           read_jsonl, user_path, write_jsonl)
+
+# Summaries are written by a background worker so ending a session returns
+# immediately. Every job state change is appended to the user's JOBS_LOG before
+# the work starts, so a crash leaves a pending job that is picked up again on restart.
+# Jobs record the process that owns them: a process claims a job under the
+# user's CLAIMS_LOCK before running it, and skips jobs that are done or owned
+# by another process that is still running.
+
+JOBS_LOG = "summary_jobs.jsonl"
+CLAIMS_LOCK = "summary_jobs.claims"
+MAX_WORKERS = 2
+MAX_ATTEMPTS = 3
+
+# Job states
+PENDING = "pending"
+READY = "ready"
+FAILED = "failed"
+
+_executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="summary-job")
+_lock = threading.Lock()
+_jobs = {}
+_resumed = False
+
+
+# Function to record the new state of a job in memory and in the user's job log
+# (the fsync'd append runs outside the in-memory lock)
+def _record(job):
+    with _lock:
+        _jobs[job["job_id"]] = job
+    append_jsonl(user_path(job["user_id"], JOBS_LOG), job)
+
+
+# Function to claim a job for this process: False if it is done or another running process owns it
+def _claim(job_id):
+    with _lock:
+        job = _jobs[job_id]
+    owner = process_owner()
+    with file_lock(user_path(job["user_id"], CLAIMS_LOCK)):
+        logged = None
+        for record in read_jsonl(user_path(job["user_id"], JOBS_LOG)):
+            if record["job_id"] == job_id:
+                logged = record
+        if logged and (logged["status"] == READY
+                       or logged.get("owner") != owner and owner_alive(logged.get("owner"))):
+            with _lock:
+                _jobs[job_id] = logged
+            return False
+        if not logged or logged.get("owner") != owner:
+            _record(dict(job, owner=owner))
+    return True
+
+
+# Function to find a summary already written for a session
+def _existing_summary(session_timestamp, user_id):
+    for summary_entry in reversed(data_access.load_summaries(user_id)):
+        if summary_entry.get("session_timestamp") == session_timestamp:
+            return summary_entry
+    return None
+
+
+# Function to run a job: summarize(entries, session_timestamp, user_id) must save and return the summary
+def _run(job_id, summarize):
+    if not _claim(job_id):
+        return
+    with _lock:
+        job = dict(_jobs[job_id])
+    job["attempts"] += 1
+
+    try:
+        # A crash after saving but before recording READY must not summarize twice
+        summary_entry = _existing_summary(job["session_timestamp"], job["user_id"])
+        if summary_entry is None:
+            summary_entry = summarize(job["entries"], job["session_timestamp"], job["user_id"])
+    except Exception as e:
+        job["status"] = FAILED
+        job["error"] = str(e)
+        _record(job)
+        return
+
+    job["status"] = READY
+    job["summary"] = summary_entry
+    job.pop("error", None)
+    job.pop("entries", None)
+    _record(job)
+
+
+# Function to queue the summary of a user's saved session, returning the job id
+def submit(session, summarize, user_id=DEFAULT_USER):
+    job = {
+        "job_id": uuid.uuid4().hex,
+        "status": PENDING,
+        "user_id": user_id,
+        "session_timestamp": session["session_timestamp"],
+        "entries": session["entries"],
+        "attempts": 0,
+        "owner": process_owner(),
+    }
+    _record(job)
+    _executor.submit(_run, job["job_id"], summarize)
+    return job["job_id"]
+
+
+# Function to get the current state of a job (None if unknown)
+def get_job(job_id):
+    with _lock:
+        return _jobs.get(job_id)
+
+
+# Function to queue a failed job again
+def retry(job_id, summarize):
+    job = get_job(job_id)
+    if not job or job["status"] != FAILED:
+        return
+    job = dict(job, status=PENDING)
+    _record(job)
+    _executor.submit(_run, job_id, summarize)
+
+
+# Function to resubmit jobs left unfinished by processes that are gone (runs once per process)
+def resume_pending(summarize):
+    global _resumed
+    with _lock:
+        if _resumed:
+            return
+        _resumed = True
+
+    unfinished = []
+    for user_id in list_users():
+        unfinished.extend(_load_unfinished(user_path(user_id, JOBS_LOG), user_id))
+    unfinished.extend(_migrate_legacy_jobs())
+    with _lock:
+        for job in unfinished:
+            _jobs.setdefault(job["job_id"], job)
+
+    for job in unfinished:
+        # Claimed again in _run, in case another process resumes it first
+        if job["attempts"] < MAX_ATTEMPTS and not owner_alive(job.get("owner")):
+            _executor.submit(_run, job["job_id"], summarize)
+
+
+# Function to move the jobs logged before storage was split per user to the
+# default user, returning the unfinished ones
+def _migrate_legacy_jobs():
+    if not os.path.exists(JOBS_LOG):
+        return []
+    with file_lock(JOBS_LOG):
+        # Another process may have moved them while this one waited
+        if not os.path.exists(JOBS_LOG):
+            return []
+        legacy = _unfinished(JOBS_LOG, DEFAULT_USER)
+        os.makedirs(user_path(DEFAULT_USER), exist_ok=True)
+        for job in legacy:
+            append_jsonl(user_path(DEFAULT_USER, JOBS_LOG), job)
+        os.remove(JOBS_LOG)
+    return legacy
+
+
+# Function to get the latest state of every unfinished job in a job log
+def _unfinished(path, user_id):
+    latest = {}
+    for job in read_jsonl(path):
+        latest[job["job_id"]] = dict(job, user_id=job.get("user_id", user_id))
+    return [job for job in latest.values() if job["status"] != READY]
+
+
+# Function to read the unfinished jobs of a job log, dropping the finished ones from it
+def _load_unfinished(path, user_id):
+    with file_lock(path):
+        unfinished = _unfinished(path, user_id)
+        if os.path.exists(path):
+            write_jsonl(path, unfinished)
+    return unfinished
@@ -0,0 +1,177 @@
+import json
+import os
+import threading
+
+# Speech-to-text backends for speech input.
+#
+# A backend turns audio chunks (speech_recognition.AudioData) into text. Each
+# recording opens a stream on it; the stream is fed chunks as they are captured
+# and returns the text it is sure of plus a partial guess for the words still
+# being spoken:
+#   - "google": the Google Web Speech API, one network request per chunk
+#   - "vosk": an offline Kaldi model with true streaming recognition
+#   - "whisper": an offline faster-whisper model on the CPU, one pass per chunk
+# Offline models are loaded once per process and shared by every recording.
+#
+# SPEECH_BACKEND picks the backend (default "google"); VOSK_MODEL_PATH and
+# WHISPER_MODEL set the offline model to load.
+
+SAMPLE_RATE = 16000
+VOSK_MODEL_PATH = os.environ.get("VOSK_MODEL_PATH", "vosk-model-small-en-us-0.15")
+WHISPER_MODEL = os.environ.get("WHISPER_MODEL", "base.en")
+
+_lock = threading.Lock()
+_models_lock = threading.Lock()
+_models = {}
+
+
+# Raised by backends for audio that holds no words
+class NoSpeech(Exception):
+    pass
+
+
+# Function to load a model once per process, keyed by name
+def _load_model(key, loader):
+    with _models_lock:
+        if key not in _models:
+            _models[key] = loader()
+        return _models[key]
+
+
+# 16 kHz 16-bit mono PCM of an audio chunk, the format offline models expect
+def pcm16(audio):
+    return audio.get_raw_data(convert_rate=SAMPLE_RATE, convert_width=2)
+
+
+# Stream for backends without incremental decoding: every chunk is transcribed on its own
+class ChunkStream:
+    def __init__(self, transcribe):
+        self.transcribe = transcribe
+
+    # Feed a chunk, returning (final text, partial text)
+    def accept(self, audio):
+        try:
+            return self.transcribe(audio).strip(), ""
+        except NoSpeech:
+            return "", ""
+
+    # Text still held back once the audio has ended
+    def finish(self):
+        return ""
+
+
+class GoogleBackend:
+    name = "google"
+
+    def transcribe(self, audio):
+        # Deferred: only needed when speech input is used
+        import speech_recognition as sr
+
+        try:
+            return sr.Recognizer().recognize_google(audio)
+        except sr.UnknownValueError:
+            raise NoSpeech()
+        except sr.RequestError as e:
+            raise RuntimeError(f"API unavailable: {e}")
+
+    def stream(self):
+        return ChunkStream(self.transcribe)
+
+
+class VoskStream:
+    def __init__(self, model):
+        from vosk import KaldiRecognizer
+
+        self.recognizer = KaldiRecognizer(model, SAMPLE_RATE)
+
+    def accept(self, audio):
+        # The recognizer keeps its state across chunks, so words split
+        # between two chunks are still recognized
+        if self.recognizer.AcceptWaveform(pcm16(audio)):
+            return json.loads(self.recognizer.Result())["text"], ""
+        return "", json.loads(self.recognizer.PartialResult())["partial"]
+
+    def finish(self):
+        return json.loads(self.recognizer.FinalResult())["text"]
+
+
+class VoskBackend:
+    name = "vosk"
+
+    def __init__(self, model_path=VOSK_MODEL_PATH):
+        self.model_path = model_path
+
+    def model(self):
+        def load():
+            from vosk import Model, SetLogLevel
+
+            SetLogLevel(-1)
+            return Model(self.model_path)
+        return _load_model(("vosk", self.model_path), load)
+
+    def transcribe(self, audio):
+        stream = self.stream()
+        final, _ = stream.accept(audio)
+        text = " ".join(part for part in (final, stream.finish()) if part)
+        if not text:
+            raise NoSpeech()
+        return text
+
+    def stream(self):
+        return VoskStream(self.model())
+
+
+class WhisperBackend:
+    name = "whisper"
+
+    def __init__(self, model_size=WHISPER_MODEL):
+        self.model_size = model_size
+
+    def model(self):
+        def load():
+            from faster_whisper import WhisperModel
+
+            return WhisperModel(self.model_size, device="cpu", compute_type="int8")
+        return _load_model(("whisper", self.model_size), load)
+
+    def transcribe(self, audio):
+        import numpy as np
+
+        samples = np.frombuffer(pcm16(audio), dtype=np.int16).astype(np.float32) / 32768.0
+        segments, _ = self.model().transcribe(samples, language="en", beam_size=1, vad_filter=True)
+        text = " ".join(segment.text.strip() for segment in segments)
+        if not text:
+            raise NoSpeech()
+        return text
+
+    def stream(self):
+        return ChunkStream(self.transcribe)
+
+
+# Available backends (SPEECH_BACKEND, default "google")
+BACKENDS = {
+    "google": GoogleBackend,
+    "vosk": VoskBackend,
+    "whisper": WhisperBackend,
+}
+
+_backend = None
+
+
+# Function to get the process-wide backend
+def get_backend():
+    global _backend
+    with _lock:
+        if _backend is None:
+            name = os.environ.get("SPEECH_BACKEND", "google")
+            if name not in BACKENDS:
+                raise ValueError(f"Unknown speech backend: {name}")
+            _backend = BACKENDS[name]()
+        return _backend
+
+
+# Function to replace the process-wide backend
+def set_backend(backend):
+    global _backend
+    with _lock:
+        _backend = backend
@@ -0,0 +1,133 @@
+import streamlit as st
+import data_access
+import speech_worker
+from journal_store import parse_timestamp
+from llm import BackendError
+
+# Page pieces shared by both apps: chat bubbles and streamed replies, paged
+# lists, search results, mood charts and the speech recording status. They read
+# and write st.session_state like the apps themselves; what differs between the
+# apps (the journal's metadata, what to do with a transcript) is passed in.
+
+# Past sessions and summaries shown per page
+PAGE_SIZE = 10
+
+# Search matches shown in the sidebar
+SEARCH_RESULTS = 10
+
+
+# Function to render a chat bubble (also redrawn while a reply streams in)
+def render_message(container, css_class, label, content):
+    container.markdown(f"""
+    <div class="{css_class}">
+        <strong>{label}:</strong><br>{content}
+    </div>
+    """, unsafe_allow_html=True)
+
+
+# Function to stream a chat reply into a placeholder and return the full text
+# (None if the model could not be reached)
+def stream_reply(chat, message, placeholder, css_class, label):
+    try:
+        text = chat.send(message, on_text=lambda text: render_message(placeholder, css_class, label, text))
+    except BackendError as e:
+        placeholder.error(f"⚠ Couldn't get a reply: {e}")
+        return None
+    return text.strip()
+
+
+# Function to start recording speech in the background
+def start_recording():
+    st.session_state.speech_recording = speech_worker.start()
+
+
+# Function to stop the current recording; what was captured is still transcribed
+def stop_recording():
+    speech_worker.stop(st.session_state.speech_recording)
+
+
+# Function to show the current recording and, once it finishes, put its
+# transcript in the input_key text box and call on_submit().
+# Returns True while the recording is still running, so the page keeps polling.
+def render_recording(input_key, on_submit):
+    recording = speech_worker.get(st.session_state.speech_recording)
+    if recording is None:
+        st.session_state.speech_recording = None
+        return False
+
+    if recording.status == speech_worker.LISTENING:
+        st.info("🎤 Listening... Speak now.")
+    elif recording.status == speech_worker.TRANSCRIBING:
+        st.info("🔁 Transcribing...")
+    if recording.partials:
+        st.markdown(f"*{recording.text()}*")
+    if recording.active():
+        return True
+
+    st.session_state.speech_recording = None
+    speech_worker.discard(recording.recording_id)
+    if recording.error:
+        st.error(f"⚠ {recording.error}")
+    if recording.text():
+        st.session_state[input_key] = recording.text()
+        on_submit()
+        st.rerun()
+    elif not recording.error:
+        st.error("❌ Sorry, couldn't understand you.")
+    return False
+
+
+# Function to get the [start, end) rows shown on the current page of a list, newest first
+def page_bounds(key, total):
+    pages = max(1, -(-total // PAGE_SIZE))
+    page = min(st.session_state.get(key, 0), pages - 1)
+    end = total - page * PAGE_SIZE
+    return max(0, end - PAGE_SIZE), end
+
+
+# Function to switch the page of a list
+def set_page(key, page):
+    st.session_state[key] = page
+
+
+# Function to show the newer/older buttons of a paged list
+def render_page_controls(key, total):
+    pages = -(-total // PAGE_SIZE)
+    if pages <= 1:
+        return
+    page = min(st.session_state.get(key, 0), pages - 1)
+    newer, label, older = st.columns([1, 2, 1])
+    newer.button("◀", key=f"{key}_newer", disabled=page == 0, on_click=set_page, args=(key, page - 1))
+    label.caption(f"Page {page + 1} of {pages}")
+    older.button("▶", key=f"{key}_older", disabled=page >= pages - 1, on_click=set_page, args=(key, page + 1))
+
+
+# Function to show the best matches for a search with their date and a highlighted snippet.
+# Returns True while the journal is still being indexed, so the page keeps polling.
+def render_search_results(query, user_id):
+    results = data_access.search(query, user_id, SEARCH_RESULTS)
+    if results is None:
+        st.caption("🔄 Indexing your journal for search...")
+        return True
+    if not results:
+        st.caption("No matches.")
+        return False
+    for result in results:
+        found_date = parse_timestamp(result["session_timestamp"] or result["timestamp"]).strftime("%B %d, %Y")
+        label = "📝 Summary" if result["kind"] == "summary" else "✏️ Entry"
+        st.markdown(f"**{label}** · {found_date}  \n{result['snippet']}")
+    return False
+
+
+# Function to chart mood over time and the mix of emotions of a journal's metadata
+# (see metadata_index), from the local sentiment scores
+def render_mood_trends(journal_meta):
+    unit = st.radio("Mood by", ("day", "week", "month"), horizontal=True, key="mood_unit")
+    dates, moods = journal_meta.mood_trend(unit)
+    if not dates:
+        st.caption("No entries to score yet.")
+        return
+    st.line_chart({"date": dates, "mood": moods}, x="date", y="mood", height=200)
+    shares = journal_meta.emotion_shares()
+    st.bar_chart({"emotion": list(shares), "share": list(shares.values())}, x="emotion", y="share", height=200)
+    st.caption("Mood runs from -1 (low) to 1 (high), scored on this device from your own words.")